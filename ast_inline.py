@@ -1,11 +1,100 @@
 import ast
+import dataclasses
 import inspect
+import os
+import pickle
+import sys
 import textwrap
-from typing import List
+from collections import ChainMap, OrderedDict
+from itertools import islice
+from typing import Any, Callable, Dict, List, NamedTuple, Set, Tuple
 
 import ipdb
 from icecream import Source, callOrValue, ic
 
+import ast_optimize
+
+
+AST_CACHE_SIZE = 256
+LOOPS = (ast.For, ast.While, ast.AsyncFor)
+
+
+class ASTCache:
+    """
+    Bounded LRU of (value, pickled AST). Every get hands out a fresh deep copy of the AST, pickle.loads is
+    cheaper than both ast.parse and copy.deepcopy, and callers are free to transform what they get.
+    """
+
+    def __init__(self, maxsize: int = AST_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build: Callable[[], Tuple[Any, ast.AST]]) -> Tuple[Any, ast.AST]:
+        if key is None:  # nothing to key on, e.g. no code object
+            return build()
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            value, pickled = self.entries[key]
+            return value, pickle.loads(pickled)
+        self.misses += 1
+        value, node = build()
+        # copy_ast first, the shared ast.Load() / ast.Store() instances may carry executing's parent links
+        self.entries[key] = value, pickle.dumps(copy_ast(node), pickle.HIGHEST_PROTOCOL)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return value, node
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+
+source_ast_cache = ASTCache()
+call_node_cache = ASTCache()
+
+
+def copy_ast(node):
+    """Deep copy of the fields and locations only, drops extra attributes such as the parent links executing adds."""
+    if isinstance(node, list):
+        return [copy_ast(item) for item in node]
+    if not isinstance(node, ast.AST):
+        return node
+    return type(node)(**{name: copy_ast(getattr(node, name)) for name in node._fields + node._attributes
+                         if hasattr(node, name)})
+
+
+def source_mtime(file: str):
+    try:
+        return os.stat(file).st_mtime_ns
+    except OSError:  # <stdin>, notebook cells ...
+        return None
+
+
+def get_source_ast(func) -> Tuple[str, ast.Module]:
+    """Source of func and the AST of its dedented source, cached by code object and source file mtime."""
+    code = getattr(inspect.unwrap(func), '__code__', None)
+    key = (code, source_mtime(code.co_filename)) if code is not None else None
+
+    def build():
+        src = inspect.getsource(func)
+        return src, ast.parse(textwrap.dedent(src))
+
+    return source_ast_cache.get(key, build)
+
+
+def get_call_node(call_frame) -> ast.Call:
+    """The call node being executed in call_frame, cached by (code, instruction offset)."""
+    key = (call_frame.f_code, call_frame.f_lasti)
+    return call_node_cache.get(key, lambda: (None, copy_ast(Source.executing(call_frame).node)))[1]
+
+
+def clear_ast_caches():
+    source_ast_cache.clear()
+    call_node_cache.clear()
+
 
 def find_variable_name(var, global_ctx: dict):
     for name, value in global_ctx.items():
@@ -14,58 +103,168 @@ def find_variable_name(var, global_ctx: dict):
     return None
 
 
-def parse_obj_to_ast_node(obj, global_ctx: dict = None):
-    if isinstance(obj, (int, float, str, bool)):
-        return ast.Constant(value=obj)
-    elif var_name := find_variable_name(obj, global_ctx or {}):
+def build_name_index(*namespaces: dict) -> Dict[int, str]:
+    """
+    id(value) -> name, built once per inlined call instead of scanning the namespace for every value.
+    Earlier namespaces win (pass f_locals before f_globals), within one the first binding wins like find_variable_name.
+    """
+    index = {}
+    for namespace in namespaces:
+        for name, value in namespace.items():
+            index.setdefault(id(value), name)
+    return index
+
+
+def frame_namespace(frame) -> ChainMap:
+    """Names visible at the call site, locals shadow globals."""
+    return ChainMap(frame.f_locals, frame.f_globals)
+
+
+class MaterializePolicy(NamedTuple):
+    """How much of an argument value parse_obj_to_ast_node spells out as a literal."""
+    max_items: int = 1000  # bigger containers / arrays are cut to their first `preview_items` followed by ...
+    preview_items: int = 10
+    max_str_len: int = 10_000  # longer str / bytes become a placeholder unless a name refers to them
+    max_depth: int = 50
+    max_nodes: int = 10_000  # literal nodes per argument, whatever comes after is left out as ...
+
+
+DEFAULT_POLICY = MaterializePolicy()
+
+
+def parse_obj_to_ast_node(obj, global_ctx: dict = None, name_index: Dict[int, str] = None,
+                          policy: MaterializePolicy = None):
+    """
+    Expression for an argument value: a literal, the name the caller knows it by, or for values too big
+    or not literal-able a placeholder such as `[1, 2, ...]`, `np.ndarray((1000000,), dtype='float64')` or
+    `DataFrame(..., shape=(10, 2))`. Memory stays bounded by policy.max_nodes whatever the size of obj.
+    """
+    policy = policy or DEFAULT_POLICY
+    if isinstance(obj, (int, float, bool)) or obj is None or isinstance(obj, str) and len(obj) <= policy.max_str_len:
+        return ast.Constant(value=obj)  # None first, any unset global would match it
+    elif var_name := (name_index.get(id(obj)) if name_index is not None
+                      else find_variable_name(obj, global_ctx or {})):
         return ast.Name(id=var_name, ctx=ast.Load())
-    elif isinstance(obj, list):
-        return ast.List(elts=[parse_obj_to_ast_node(item) for item in obj])
+    return materialize(obj, policy, name_index or {}, [policy.max_nodes])
+
+
+def _type_ref(cls: type, name_index: Dict[int, str]) -> ast.expr:
+    """Name the caller uses for cls, else its qualified name."""
+    return ast.Name(id=name_index.get(id(cls)) or cls.__qualname__, ctx=ast.Load())
+
+
+def _numpy_ref(attr: str, name_index: Dict[int, str]) -> ast.expr:
+    module_name = name_index.get(id(sys.modules.get('numpy'))) or 'numpy'
+    return ast.Attribute(value=ast.Name(id=module_name, ctx=ast.Load()), attr=attr, ctx=ast.Load())
+
+
+def _placeholder(obj, name_index: Dict[int, str], **info) -> ast.Call:
+    """`Type(..., **info)`, e.g. `DataFrame(..., shape=(10, 2))`."""
+    shape = getattr(obj, 'shape', None)
+    if isinstance(shape, tuple) and all(isinstance(size, int) for size in shape):
+        info.setdefault('shape', shape)
+    return ast.Call(func=_type_ref(type(obj), name_index), args=[ast.Constant(value=...)],
+                    keywords=[ast.keyword(arg=k, value=ast.Constant(value=v)) for k, v in info.items()])
+
+
+def materialize(obj, policy: MaterializePolicy, name_index: Dict[int, str], budget: List[int], depth: int = 0):
+    """Literal expression for obj within policy, `budget` counts down the nodes left for the whole argument."""
+    budget[0] -= 1
+    if isinstance(obj, (int, float, bool, complex)) or obj is None or obj is ...:
+        return ast.Constant(value=obj)
+    elif isinstance(obj, (str, bytes)):
+        if len(obj) <= policy.max_str_len:
+            return ast.Constant(value=obj)
+        return _placeholder(obj, name_index, len=len(obj))
+    elif isinstance(obj, ast.AST):
+        return obj
+    elif depth >= policy.max_depth:
+        return _placeholder(obj, name_index)
+
+    def items(values, size: int, n_parts: int = 1) -> List[tuple]:
+        """
+        Literals for the first values within max_items and the node budget, `...` stands for the rest.
+        With n_parts > 1 values are (key, value) pairs and so are the results.
+        """
+        elts = []
+        for value in islice(values, size if size <= policy.max_items else policy.preview_items):
+            if budget[0] <= 0:
+                break
+            parts = value if n_parts > 1 else (value,)
+            elts.append(tuple(materialize(part, policy, name_index, budget, depth + 1) for part in parts))
+        if len(elts) < size:
+            elts.append((ast.Constant(value=...),) * n_parts)
+        return elts
+
+    if isinstance(obj, list):
+        return ast.List(elts=[elt for elt, in items(obj, len(obj))], ctx=ast.Load())
     elif isinstance(obj, dict):
-        return ast.Dict(keys=[parse_obj_to_ast_node(k) for k in obj.keys()],
-                        values=[parse_obj_to_ast_node(v) for v in obj.values()])
+        pairs = items(obj.items(), len(obj), n_parts=2)
+        return ast.Dict(keys=[key for key, _ in pairs], values=[value for _, value in pairs])
     elif isinstance(obj, tuple):
-        return ast.Tuple(elts=[parse_obj_to_ast_node(item) for item in obj])
+        return ast.Tuple(elts=[elt for elt, in items(obj, len(obj))], ctx=ast.Load())
     elif isinstance(obj, set):
-        return ast.Set(elts=[parse_obj_to_ast_node(item) for item in obj])
-    elif isinstance(obj, type(None)):
-        return ast.Constant(value=None)
-    elif isinstance(obj, ast.AST):
-        return obj
+        return ast.Set(elts=[elt for elt, in items(obj, len(obj))])
+    elif isinstance(obj, frozenset):
+        return ast.Call(func=ast.Name(id='frozenset', ctx=ast.Load()),
+                        args=[ast.Set(elts=[elt for elt, in items(obj, len(obj))])] if obj else [], keywords=[])
+    elif type(obj).__module__ == 'numpy' and hasattr(obj, 'dtype'):
+        if not hasattr(obj, 'shape') or obj.shape == ():  # numpy scalar
+            return ast.Constant(value=obj.item())
+        dtype = ast.keyword(arg='dtype', value=ast.Constant(value=str(obj.dtype)))
+        if obj.size <= policy.max_items and obj.size <= budget[0] and obj.dtype.kind in 'biufcU':
+            return ast.Call(func=_numpy_ref('array', name_index),
+                            args=[materialize(obj.tolist(), policy, name_index, budget, depth + 1)], keywords=[dtype])
+        return ast.Call(func=_numpy_ref('ndarray', name_index), args=[ast.Constant(value=obj.shape)], keywords=[dtype])
+    elif dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return ast.Call(func=_type_ref(type(obj), name_index), args=[],
+                        keywords=[ast.keyword(arg=field.name, value=materialize(getattr(obj, field.name), policy,
+                                                                                name_index, budget, depth + 1))
+                                  for field in dataclasses.fields(obj) if field.init])
     else:
-        raise NotImplementedError(f'obj type {type(obj)} cannot be parsed to ast node')
+        try:
+            return _placeholder(obj, name_index, len=len(obj))
+        except TypeError:
+            return _placeholder(obj, name_index)
 
 
-def expand_kwargs(node: ast.Name, global_ctx: dict):
+def expand_kwargs(node: ast.Name, global_ctx: dict, name_index: Dict[int, str] = None,
+                  policy: MaterializePolicy = None):
     var_name = node.id
     var = global_ctx.get(var_name)
     assert isinstance(var, dict)
-    kwargs = {k: parse_obj_to_ast_node(v, global_ctx) for k, v in var.items()}
+    name_index = build_name_index(global_ctx) if name_index is None else name_index
+    kwargs = {k: parse_obj_to_ast_node(v, name_index=name_index, policy=policy) for k, v in var.items()}
     return kwargs
 
 
-def expand_args(node: ast.Name, global_ctx: dict):
+def expand_args(node: ast.Name, global_ctx: dict, name_index: Dict[int, str] = None,
+                policy: MaterializePolicy = None):
     var_name = node.id
     var = global_ctx.get(var_name)
     assert isinstance(var, (list, tuple))
-    args = [parse_obj_to_ast_node(v, global_ctx) for v in var]
+    name_index = build_name_index(global_ctx) if name_index is None else name_index
+    args = [parse_obj_to_ast_node(v, name_index=name_index, policy=policy) for v in var]
     return args
 
 
-def unpack_call(call_frame, debug=False):
-    callNode = Source.executing(call_frame).node
+def unpack_call(call_frame, debug=False, name_index: Dict[int, str] = None, policy: MaterializePolicy = None):
+    callNode = get_call_node(call_frame)
+    namespace = frame_namespace(call_frame)
+    if name_index is None:
+        name_index = build_name_index(call_frame.f_locals, call_frame.f_globals)
 
     call = callNode.args[0]
     if isinstance(call.func, ast.Name):  # function call
         func_name = call.func.id
-        func = call_frame.f_globals.get(func_name)
+        func = namespace.get(func_name)
         method_ptr = None
 
         if not hasattr(func, '__name__'):  # handle __call__ case of method call
             # func = func.__call__
             func_instance, func = func, func.__call__
             method_ptr = {'instance_name': func_name,
-                          'instance_ref': parse_obj_to_ast_node(func_instance, call_frame.f_globals),
+                          'instance_ref': parse_obj_to_ast_node(func_instance, name_index=name_index, policy=policy),
                           'method_name': func_name + '_call',
                           'instance_type': type(func_instance),
                           'super_class_name': func_instance.__class__.__bases__[0].__name__}
@@ -79,7 +278,7 @@ def unpack_call(call_frame, debug=False):
             func_val = func_val.value
         attr_list.append(func_val.id)
         instance_name = attr_list.pop()
-        instance = call_frame.f_globals.get(instance_name)
+        instance = namespace.get(instance_name)
         while attr_list:
             instance_name = attr_list.pop()
             instance = getattr(instance, instance_name)
@@ -98,7 +297,7 @@ def unpack_call(call_frame, debug=False):
         if debug:
             ic(arg)
         if isinstance(arg, ast.Starred):
-            expanded_args = expand_args(arg.value, call_frame.f_globals)
+            expanded_args = expand_args(arg.value, namespace, name_index, policy)
             args.extend(expanded_args)
         else:
             args.append(callOrValue(arg))
@@ -108,7 +307,7 @@ def unpack_call(call_frame, debug=False):
         if debug:
             ic(kw.arg, kw.value)
         if kw.arg is None and isinstance(kw.value, ast.Name):
-            expanded_kwargs = expand_kwargs(kw.value, call_frame.f_globals)
+            expanded_kwargs = expand_kwargs(kw.value, namespace, name_index, policy)
             kwargs = kwargs | expanded_kwargs
         else:
             kwargs[kw.arg] = callOrValue(kw.value)
@@ -116,7 +315,8 @@ def unpack_call(call_frame, debug=False):
     return func, args, kwargs, method_ptr
 
 
-def get_argument_map(func, args, kwargs, method_ptr, unparsed=False, debug=False):
+def get_argument_map(func, args, kwargs, method_ptr, unparsed=False, debug=False, name_index: Dict[int, str] = None,
+                     policy: MaterializePolicy = None):
     if debug:
         ic(args, kwargs)
 
@@ -140,7 +340,7 @@ def get_argument_map(func, args, kwargs, method_ptr, unparsed=False, debug=False
         elif isinstance(v, (ast.AST, tuple, dict)):
             post_argument_map[k] = v
         else:
-            obj_ast = parse_obj_to_ast_node(v)
+            obj_ast = parse_obj_to_ast_node(v, name_index=name_index or {}, policy=policy)
             post_argument_map[k] = obj_ast
 
     if debug:
@@ -165,6 +365,21 @@ class VariableRenameTransformer(ast.NodeTransformer):
         return self.generic_visit(node)
 
 
+class VariablesRenameTransformer(ast.NodeTransformer):
+    """Renames names and the parameters binding them, those of nested functions and lambdas included."""
+
+    def __init__(self, renames: Dict[str, str]):
+        self.renames = renames
+
+    def visit_Name(self, node):
+        node.id = self.renames.get(node.id, node.id)
+        return node
+
+    def visit_arg(self, node):
+        node.arg = self.renames.get(node.arg, node.arg)
+        return self.generic_visit(node)
+
+
 class VariableNodeTransformer(ast.NodeTransformer):
     def __init__(self, var_name: str, new_node: ast.AST):
         self.var_name = var_name
@@ -254,51 +469,148 @@ def extract_arg_names(argument_map: dict) -> List[str]:
     return list(set(arg_names))
 
 
+def make_assignment(var_name: str, value: ast.expr, location: ast.AST = None) -> ast.Assign:
+    """`var_name = value` as a node, located at `location` (value nodes keep their own positions)."""
+    assignment = ast.Assign(targets=[ast.Name(id=var_name, ctx=ast.Store())], value=value)
+    if location is not None:
+        ast.copy_location(assignment, location)
+    return ast.fix_missing_locations(assignment)
+
+
 def prepend_assignments(func_def: ast.FunctionDef, argument_map: dict, pre_map: dict):
+    """Bind the arguments at the top of func_def's body, one assignment each in argument_map order."""
+    assignments = []
     for arg_name, val in argument_map.items():
         new_var = pre_map.get(arg_name, arg_name)
         if isinstance(val, ast.AST):
-            func_def.body.insert(
-                0, ast.parse(f'{new_var} = {ast.unparse(val)}'))
+            assignments.append(make_assignment(new_var, val, func_def))
             continue
 
-        if isinstance(val, ast.Name):
-            new_var = pre_map.get(arg_name, arg_name)
-            if arg_name == val.id:
-                continue
-            func_def.body.insert(
-                0, ast.parse(f'{new_var} = {val.id}'))
-
         if isinstance(val, tuple):  # args case
-            func_def.body.insert(
-                0, ast.parse(f'{new_var} = {ast.unparse(ast.Tuple(elts=val))}'))
+            assignments.append(make_assignment(new_var, ast.Tuple(elts=list(val), ctx=ast.Load()), func_def))
             continue
 
         if isinstance(val, dict):  # kwargs case
             dict_ast = ast.Dict(keys=[ast.Constant(k) for k in val.keys()],
                                 values=[v for v in val.values()])
-            func_def.body.insert(
-                0, ast.parse(f'{new_var} = {ast.unparse(dict_ast)}'))
+            assignments.append(make_assignment(new_var, dict_ast, func_def))
             continue
+    func_def.body[0:0] = assignments
 
 
 def refresh_var_names(func_ast: ast.AST, arg_names: List[str]):
+    """
+    Rename every name in func_ast that collides with an argument name by appending the fewest underscores
+    not used yet (x -> x_, or x__ if x_ exists). Arg names are processed in order and each one sees the renames
+    of the previous ones, but the renames are tracked on the set of distinct names: one walk to collect them,
+    one transformer visit to apply them.
+    """
+    names_by_current = {}  # current name -> original names now carrying it
+    for node in ast.walk(func_ast):
+        if isinstance(node, ast.Name) and node.id not in names_by_current:
+            names_by_current[node.id] = [node.id]
+
     var_to_new_var = {}
     for arg_name in arg_names:
         base_underscore_count = count_trailing_underscores(arg_name)
-        existing_underscore_counts = [count_trailing_underscores(node.id) - base_underscore_count
-                                      for node in ast.walk(func_ast)
-                                      if isinstance(node, ast.Name) and arg_name in node.id]
+        existing_underscore_counts = {count_trailing_underscores(name) - base_underscore_count
+                                      for name in names_by_current if arg_name in name}
         if existing_underscore_counts:
-            min_underscore_count = min(set(range(1, 100)) - set(existing_underscore_counts))
+            min_underscore_count = next((count for count in range(1, 100) if count not in existing_underscore_counts),
+                                        None)
+            if min_underscore_count is None:
+                raise ValueError(f'no free name left for {arg_name}')
             new_var_name = arg_name + '_' * min_underscore_count
-            avoid_arg_name = VariableRenameTransformer(arg_name, new_var_name)
-            avoid_arg_name.visit(func_ast)
-            # func_ast: ast.Module =
+            if renamed := names_by_current.pop(arg_name, None):
+                names_by_current.setdefault(new_var_name, []).extend(renamed)
             var_to_new_var[arg_name] = new_var_name
+
+    renames = {name: current for current, names in names_by_current.items() for name in names if name != current}
+    if renames:
+        VariablesRenameTransformer(renames).visit(func_ast)
     return var_to_new_var
 
 
+def rename_apart(func_def: ast.FunctionDef, taken: Set[str], keep: Set[str] = frozenset()) -> Dict[str, str]:
+    """
+    Rename the parameters and assigned names of func_def that are in `taken` by appending the fewest underscores
+    free in both, keep aside: the block runs in the call site's scope, where it would overwrite them. Nested
+    functions see the same renames, their parameters included.
+    """
+    args = func_def.args
+    bound = [arg.arg for arg in args.posonlyargs + args.args + [args.vararg] + args.kwonlyargs + [args.kwarg] if arg]
+    bound += [node.id for node in ast.walk(func_def) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store)]
+    used = {node.id if isinstance(node, ast.Name) else node.arg for node in ast.walk(func_def)
+            if isinstance(node, (ast.Name, ast.arg))} | set(taken)
+    renames = {}
+    for name in dict.fromkeys(bound):
+        if name in taken and name not in keep:
+            new_name = name + '_'
+            while new_name in used:
+                new_name += '_'
+            used.add(new_name)
+            renames[name] = new_name
+    if renames:
+        VariablesRenameTransformer(renames).visit(func_def)
+    return renames
+
+
+def bound_name(alias: ast.alias) -> str:
+    return alias.asname or alias.name.split('.')[0]
+
+
+def local_names(func: ast.AST) -> Set[str]:
+    """Names bound anywhere in func, nested scopes included: every name its inlined body may rebind."""
+    names = set()
+    for node in ast.walk(func):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node is not func:
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update(bound_name(alias) for alias in node.names)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(f'global {name}' for name in node.names)
+    return names
+
+
+def statements(body: List[ast.stmt], in_loop=False):
+    """(statement list, index, statement, inside a loop) for the statements of one function scope."""
+    for i, stmt in enumerate(body):
+        yield body, i, stmt, in_loop
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        for field in ('body', 'orelse', 'finalbody'):
+            if isinstance(block := getattr(stmt, field, None), list):
+                yield from statements(block, in_loop or isinstance(stmt, LOOPS) and field == 'body')
+        for handler in getattr(stmt, 'handlers', []):
+            yield from statements(handler.body, in_loop)
+        for case in getattr(stmt, 'cases', []):
+            yield from statements(case.body, in_loop)
+
+
+def own_nodes(stmt: ast.stmt):
+    """The nodes of stmt, without those of the statements nested in it."""
+    todo = [stmt]
+    while todo:
+        node = todo.pop()
+        yield node
+        todo.extend(child for child in ast.iter_child_nodes(node) if not isinstance(child, ast.stmt))
+
+
+def evaluation_order(node: ast.AST):
+    """node and its descendants, each before its children, children in the order python evaluates them."""
+    yield node
+    if isinstance(node, ast.Dict):
+        children = [child for pair in zip(node.keys, node.values) for child in pair if child is not None]
+    else:
+        children = ast.iter_child_nodes(node)
+    for child in children:
+        yield from evaluation_order(child)
+
+
 class VariableCollector(ast.NodeVisitor):
     def __init__(self):
         self.defined = set()  # Set of defined variables
@@ -328,11 +640,6 @@ class VariableCollector(ast.NodeVisitor):
             self.defined.add(node.target.id)
         self.generic_visit(node)
 
-    def visit_While(self, node):
-        if isinstance(node.target, ast.Name):
-            self.defined.add(node.target.id)
-        self.generic_visit(node)
-
     def visit_Name(self, node):
         if isinstance(node.ctx, ast.Load):
             self.used.add(node.id)
@@ -385,7 +692,7 @@ def extract_import(func_ast, module_ast, call_frame=None):
     return call_frame
 
 
-def inline_src(called, debug=False):
+def inline_src(called, debug=False, policy: MaterializePolicy = None, optimize=False, depth=1):
     """
     It does not work in situation where callframe isn't available! e.g. repl from commandline
 
@@ -393,6 +700,7 @@ def inline_src(called, debug=False):
     2. rename vars in func/method to avoid conflicts
         a. get all name from args and kwargs
         b. check and get var_to_new_var map
+        c. rename the parameters and locals the call site already uses, the block must not overwrite them
     3. swap variable names, append input if needed
         a. map var to new var
         b. modify accordingly:
@@ -407,21 +715,23 @@ def inline_src(called, debug=False):
             - report error if var is still undefined
         - collect all the vars that were still undefined
     4. print arguments, old func, code and imports
+    5. with depth > 1, inline the calls of the inlined block in turn, depth - 1 levels further down
+    6. with optimize=True, propagate the literal arguments, fold constants and drop what the block never reads
     """
     # Get func/method and call args
     callFrame = inspect.currentframe().f_back
-    func, args, kwargs, method_ptr = unpack_call(callFrame)
-    argument_map, method_ptr = get_argument_map(func, args, kwargs, method_ptr, debug=debug)
+    name_index = build_name_index(callFrame.f_locals, callFrame.f_globals)
+    func, args, kwargs, method_ptr = unpack_call(callFrame, name_index=name_index, policy=policy)
+    argument_map, method_ptr = get_argument_map(func, args, kwargs, method_ptr, debug=debug, name_index=name_index,
+                                                policy=policy)
     input_arguments = get_argument_map(func, args, kwargs, method_ptr, unparsed=True)
     if debug:
         ic(argument_map)
     ic(input_arguments)
 
     # Get source code
-    src = inspect.getsource(func)
-    dedented_src = textwrap.dedent(src)
-    func_ast = ast.parse(dedented_src)
-    new_func_ast: ast.Module = ast.parse(dedented_src)
+    src, new_func_ast = get_source_ast(func)
+    func_ast = get_source_ast(func)[1] if debug else None  # untouched copy, only shown / returned in debug mode
     if debug:
         print('# ------------------------ original ast: ')
         print(ast.dump(func_ast, indent=4))
@@ -434,6 +744,11 @@ def inline_src(called, debug=False):
 
     # Rename vars in func/method to avoid conflicts
     var_to_new_var = refresh_var_names(new_func_ast, arg_names)
+    self_name = method_ptr.get('instance_self_ref_name') if method_ptr else None
+    call_site_names = set(callFrame.f_locals) | set(callFrame.f_globals)
+    renames = rename_apart(new_func_ast.body[0], call_site_names, keep={self_name})
+    var_to_new_var = {name: renames.get(new_name, new_name) for name in argument_map
+                      if (new_name := var_to_new_var.get(name, name)) != name or new_name in renames}
     ic(var_to_new_var)
 
     if method_ptr and 'instance_self_ref_name' in method_ptr:
@@ -459,6 +774,18 @@ def inline_src(called, debug=False):
         SuperCallTransformer(method_ptr['instance_name'],
                              method_ptr['super_class_name']).visit(new_func_ast)
 
+    if depth > 1:
+        from inline_calls import inline_nested  # inline_calls itself builds on this module
+        code = getattr(func, '__func__', func).__code__
+        nested_inlined, nested_skipped, _ = inline_nested(new_func_def, func.__globals__, depth - 1,
+                                                          chain=frozenset({code}),
+                                                          reserved=set(callFrame.f_locals) | set(callFrame.f_globals),
+                                                          unbound=True)  # super() calls became A.p(self, ...)
+        ic(nested_inlined, nested_skipped)
+
+    if optimize:
+        new_func_def.body = ast_optimize.optimize(new_func_def.body, keep={ret_var_name})
+
     if debug:
         print('# ------------------------ new ast: ')
         print(ast.dump(new_func_ast, indent=4))
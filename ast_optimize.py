@@ -0,0 +1,263 @@
+import ast
+import operator
+from typing import Iterable, List, Optional, Set
+
+BIN_OPS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+           ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow, ast.LShift: operator.lshift,
+           ast.RShift: operator.rshift, ast.BitOr: operator.or_, ast.BitXor: operator.xor, ast.BitAnd: operator.and_}
+UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg, ast.Not: operator.not_, ast.Invert: operator.invert}
+COMPARE_OPS = {ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt, ast.LtE: operator.le,
+               ast.Gt: operator.gt, ast.GtE: operator.ge}
+MAX_FOLDED_LEN = 100  # longest str / bytes / digits a fold may produce
+SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef, ast.ListComp, ast.SetComp, ast.DictComp,
+          ast.GeneratorExp)
+
+
+def stored_names(node: ast.AST) -> Set[str]:
+    """Every name node binds or unbinds, nested scopes included."""
+    names = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Load):
+            names.add(child.id)
+        elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(child.name)
+        elif isinstance(child, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split('.')[0] for alias in child.names)
+        elif isinstance(child, (ast.Global, ast.Nonlocal)):
+            names.update(child.names)
+        elif isinstance(child, (ast.ExceptHandler, ast.MatchAs, ast.MatchStar)) and child.name:
+            names.add(child.name)
+        elif isinstance(child, ast.MatchMapping) and child.rest:
+            names.add(child.rest)
+    return names
+
+
+def read_names(nodes: Iterable[ast.AST]) -> Set[str]:
+    """Names whose current binding nodes depend on: loads, dels and augmented assignments."""
+    names = set()
+    for node in nodes:
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Store):
+                names.add(child.id)
+            elif isinstance(child, ast.AugAssign) and isinstance(child.target, ast.Name):
+                names.add(child.target.id)
+    return names
+
+
+def _small(value) -> bool:
+    if isinstance(value, (str, bytes, tuple)):
+        return len(value) <= MAX_FOLDED_LEN
+    if isinstance(value, int):
+        return value.bit_length() <= MAX_FOLDED_LEN * 3
+    return isinstance(value, (float, complex, bool, type(None)))
+
+
+def _too_big(func, values: list) -> bool:
+    """Whether func(*values) may take long or build a huge object, checked before running it."""
+    if func in (operator.pow, operator.lshift):
+        return not isinstance(values[1], (int, float)) or abs(values[1]) > 64
+    if func is operator.mul and any(isinstance(value, (str, bytes, tuple)) for value in values):
+        return any(isinstance(value, int) and value > MAX_FOLDED_LEN for value in values)
+    return False
+
+
+class ConstantFolder(ast.NodeTransformer):
+    """Evaluates operators on literals and picks the branch of conditional expressions with a literal test."""
+
+    def fold(self, node: ast.AST, func, *operands) -> ast.AST:
+        if not all(isinstance(operand, ast.Constant) and _small(operand.value) for operand in operands):
+            return node
+        values = [operand.value for operand in operands]
+        if _too_big(func, values):
+            return node
+        try:
+            value = func(*values)
+        except Exception:  # folding would raise: leave it to run time
+            return node
+        return ast.copy_location(ast.Constant(value=value), node) if _small(value) else node
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        return self.fold(node, BIN_OPS[type(node.op)], node.left, node.right)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        return self.fold(node, UNARY_OPS[type(node.op)], node.operand)
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if not all(type(op) in COMPARE_OPS for op in node.ops):
+            return node
+
+        def compare(*values):
+            return all(COMPARE_OPS[type(op)](left, right) for op, left, right in zip(node.ops, values, values[1:]))
+
+        return self.fold(node, compare, node.left, *node.comparators)
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        # a literal operand either decides the result or is skipped
+        stop = not isinstance(node.op, ast.And)
+        values = list(node.values)
+        while len(values) > 1 and isinstance(values[0], ast.Constant):
+            if bool(values[0].value) is stop:
+                return values[0]
+            values.pop(0)
+        if len(values) == 1:
+            return values[0]
+        node.values = values
+        return node
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant):
+            return node.body if node.test.value else node.orelse
+        return node
+
+    def visit_If(self, node):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant):
+            return (node.body if node.test.value else node.orelse) or [ast.copy_location(ast.Pass(), node)]
+        return node
+
+    def visit_While(self, node):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant) and not node.test.value:
+            return node.orelse or [ast.copy_location(ast.Pass(), node)]
+        return node
+
+
+class ConstantPropagator:
+    """
+    Substitutes names assigned a literal into the straight line statements that follow, until the name is bound
+    again. Compound statements that rebind a name see none of its substitutions, nested scopes are left alone.
+    """
+
+    def __init__(self, exclude: Set[str]):
+        self.exclude = exclude
+
+    def substitute(self, node: ast.AST, env: dict) -> ast.AST:
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id in env:
+            return ast.copy_location(ast.Constant(value=env[node.id]), node)
+        if isinstance(node, SCOPES):
+            # decorators and default values run here, the body runs in a scope of its own
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+                node.args.defaults = [self.substitute(child, env) for child in node.args.defaults]
+                node.args.kw_defaults = [child and self.substitute(child, env) for child in node.args.kw_defaults]
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                node.decorator_list = [self.substitute(child, env) for child in node.decorator_list]
+            return node
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, list):
+                setattr(node, field, [self.substitute(child, env) if isinstance(child, ast.AST) else child
+                                      for child in value])
+            elif isinstance(value, ast.AST) and not (isinstance(node, ast.AugAssign) and field == 'target'):
+                setattr(node, field, self.substitute(value, env))
+        return node
+
+    def block(self, body: List[ast.stmt], env: dict) -> List[ast.stmt]:
+        for stmt in body:
+            bound = stored_names(stmt)
+            if not hasattr(stmt, 'body') or isinstance(stmt, SCOPES):
+                # plain targets are bound after the value is read, assignment expressions while it is
+                walrus = {node.target.id for node in ast.walk(stmt) if isinstance(node, ast.NamedExpr)}
+                self.substitute(stmt, {name: value for name, value in env.items() if name not in walrus})
+            else:  # compound statement: loops may run a rebinding before a read
+                inner_env = {name: value for name, value in env.items() if name not in bound}
+                for field in ('test', 'iter', 'subject'):
+                    if getattr(stmt, field, None) is not None:
+                        setattr(stmt, field, self.substitute(getattr(stmt, field), inner_env))
+                for item in getattr(stmt, 'items', []):
+                    self.substitute(item, inner_env)
+                for field in ('body', 'orelse', 'finalbody'):
+                    if isinstance(getattr(stmt, field, None), list):
+                        self.block(getattr(stmt, field), dict(inner_env))
+                for handler in getattr(stmt, 'handlers', []):
+                    self.block(handler.body, dict(inner_env))
+                for case in getattr(stmt, 'cases', []):
+                    if case.guard is not None:
+                        case.guard = self.substitute(case.guard, inner_env)
+                    self.block(case.body, dict(inner_env))
+            for name in bound:
+                env.pop(name, None)
+            if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name) \
+                    and isinstance(stmt.value, ast.Constant) and stmt.targets[0].id not in self.exclude:
+                env[stmt.targets[0].id] = stmt.value.value
+        return body
+
+
+def pure(node: Optional[ast.AST]) -> bool:
+    """Evaluating node cannot run user code (beyond reading a name that may be undefined)."""
+    if node is None or isinstance(node, (ast.Constant, ast.Name, ast.Lambda)):
+        return True
+    if isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+        return all(map(pure, node.elts))
+    if isinstance(node, ast.Dict):
+        # hashing a key can run __hash__, keep literal keys only
+        return all(key is None or isinstance(key, ast.Constant) for key in node.keys) and all(map(pure, node.values))
+    if isinstance(node, ast.Starred):
+        return isinstance(node.value, (ast.Tuple, ast.List)) and pure(node.value)
+    return False
+
+
+def _dead(stmt: ast.stmt, live: Set[str]) -> bool:
+    if isinstance(stmt, ast.Pass) or isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant):
+        return True
+    if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):  # a class body runs when defined, it stays
+        args = stmt.args
+        defaults = args.defaults + [default for default in args.kw_defaults if default]
+        # annotations are evaluated with the def too
+        annotations = [arg.annotation for arg in args.posonlyargs + args.args + [args.vararg] + args.kwonlyargs
+                       + [args.kwarg] if arg] + [stmt.returns]
+        return stmt.name not in live and not stmt.decorator_list and all(map(pure, defaults + annotations))
+    if isinstance(stmt, ast.Assign):
+        return pure(stmt.value) and all(_dead_target(target, stmt.value, live) for target in stmt.targets)
+    return False
+
+
+def _dead_target(target: ast.AST, value: ast.AST, live: Set[str]) -> bool:
+    if isinstance(target, ast.Name):
+        return target.id not in live
+    # unpacking only when it cannot fail: as many plain names as literal elements
+    return isinstance(target, (ast.Tuple, ast.List)) and isinstance(value, (ast.Tuple, ast.List)) \
+        and len(target.elts) == len(value.elts) and not any(isinstance(elt, ast.Starred) for elt in value.elts) \
+        and all(isinstance(elt, ast.Name) and elt.id not in live for elt in target.elts)
+
+
+def eliminate_dead_code(body: List[ast.stmt], live: Set[str]) -> List[ast.stmt]:
+    """Drop assignments and definitions nothing in `live` reads, literal expression statements and passes."""
+    new_body = []
+    for stmt in body:
+        if _dead(stmt, live):
+            continue
+        for field in ('body', 'orelse', 'finalbody'):
+            if isinstance(getattr(stmt, field, None), list) and not isinstance(stmt, SCOPES):
+                block = eliminate_dead_code(getattr(stmt, field), live)
+                setattr(stmt, field, block or ([ast.Pass()] if field == 'body' else []))
+        for handler in getattr(stmt, 'handlers', []):
+            handler.body = eliminate_dead_code(handler.body, live) or [ast.Pass()]
+        for case in getattr(stmt, 'cases', []):
+            case.body = eliminate_dead_code(case.body, live) or [ast.Pass()]
+        new_body.append(stmt)
+    return new_body
+
+
+def optimize(body: List[ast.stmt], keep: Iterable[str] = ()) -> List[ast.stmt]:
+    """
+    Constant propagation, folding and dead code elimination on an inlined block, repeated until nothing changes.
+    `keep` are the names read after the block (e.g. the return variable), every other name the block binds is
+    treated as private to it. Returns the new statement list, the nodes are changed in place.
+    """
+    keep = set(keep)
+    exclude = {name for node in body for child in ast.walk(node) if isinstance(child, (ast.Global, ast.Nonlocal))
+               for name in child.names}
+    body = ast.Module(body=body, type_ignores=[])
+    while True:
+        before = ast.dump(body)
+        body = ConstantFolder().visit(body)
+        ConstantPropagator(exclude).block(body.body, {})
+        body = ConstantFolder().visit(body)
+        live = read_names(body.body) | keep | exclude
+        body.body = eliminate_dead_code(body.body, live)
+        if ast.dump(body) == before:
+            return ast.fix_missing_locations(body).body
@@ -0,0 +1,395 @@
+import ast
+import glob
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from ast_inline import (copy_ast, extract_arg_names, prepend_assignments, refresh_var_names,
+                        replace_return_with_assignment)
+from dep_crawl import Import, get_static_src_file, is_sub_path
+
+FunctionNode = ast.FunctionDef | ast.AsyncFunctionDef
+
+
+class InlinedCall(NamedTuple):
+    file: str
+    lineno: int
+    col_offset: int
+    call: str  # source of the call expression
+    func: str  # callee as written at the call site
+    def_file: Optional[str] = None  # file holding the resolved definition
+    code: Optional[str] = None  # inlined block, the result is assigned to `ret_var`
+    ret_var: Optional[str] = None
+    problem: Optional[str] = None  # why the call site was not inlined
+
+    @property
+    def ok(self) -> bool:
+        return self.problem is None
+
+
+class ModuleScope(NamedTuple):
+    defs: Dict[str, ast.AST]  # module level functions and classes
+    imported: Dict[str, Import]  # bound name -> `from m import name` the binding comes from
+    modules: Dict[str, str]  # bound name -> module, `import a.b` binds a -> a, `import a.b as c` c -> a.b
+
+
+def module_scope(tree: ast.Module) -> ModuleScope:
+    defs, imported, modules = {}, {}, {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            defs[node.name] = node
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    modules[alias.asname] = alias.name
+                else:
+                    modules[alias.name.split('.')[0]] = alias.name.split('.')[0]
+        elif isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                stmt = f"from {'.' * node.level}{node.module or ''} import {alias.name}"
+                imported[alias.asname or alias.name] = Import(stmt, alias.name, node.module, node.level)
+    return ModuleScope(defs, imported, modules)
+
+
+def bind_arguments(func_def: FunctionNode, call: ast.Call, copy: bool = True) -> dict:
+    """
+    Static counterpart of inspect.getcallargs on AST nodes: parameter -> argument expression, *args -> tuple
+    and **kwargs -> dict of expressions, missing parameters take the default expression of the definition.
+    `*expr` / `**expr` that only feed *args / **kwargs end up in their tuple / ast.Dict as they are.
+    Raises TypeError for calls that do not fit the signature or cannot be bound without running them.
+    With copy=False the expressions are the nodes of call and func_def themselves.
+    """
+    params = func_def.args
+    positional = [arg.arg for arg in params.posonlyargs + params.args]
+    keyword_only = [arg.arg for arg in params.kwonlyargs]
+    name = func_def.name
+
+    call_args = []
+    for arg in call.args:
+        if not isinstance(arg, ast.Starred):
+            call_args.append(arg)
+        elif isinstance(arg.value, (ast.List, ast.Tuple)) and not any(isinstance(elt, ast.Starred)
+                                                                     for elt in arg.value.elts):
+            call_args.extend(arg.value.elts)
+        elif params.vararg and len(call_args) >= len(positional):
+            call_args.append(arg)
+        else:
+            raise TypeError(f'*{ast.unparse(arg.value)} cannot be bound without running the code')
+    call_kwargs = {}
+    unpacked = []  # **expr whose keys are only known at run time, keyed (None, i) to keep their order
+    for keyword in call.keywords:
+        if keyword.arg is not None:
+            items = [(keyword.arg, keyword.value)]
+        elif isinstance(keyword.value, ast.Dict) and all(isinstance(key, ast.Constant) and isinstance(key.value, str)
+                                                         for key in keyword.value.keys):
+            items = [(key.value, value) for key, value in zip(keyword.value.keys, keyword.value.values)]
+        elif params.kwarg:
+            unpacked.append(keyword.value)
+            items = [((None, len(unpacked)), keyword.value)]
+        else:
+            raise TypeError(f'**{ast.unparse(keyword.value)} cannot be bound without running the code')
+        for arg_name, value in items:
+            if arg_name in call_kwargs:
+                raise TypeError(f'{name}() got multiple values for keyword argument {arg_name!r}')
+            call_kwargs[arg_name] = value
+
+    if len(call_args) > len(positional) and not params.vararg:
+        raise TypeError(f'{name}() takes {len(positional)} positional arguments but {len(call_args)} were given')
+    # same order as inspect.getcallargs, so the assignments come out like inline_src's
+    argument_map = dict(zip(positional, call_args))
+    if params.vararg:
+        argument_map[params.vararg.arg] = tuple(call_args[len(positional):])
+    if params.kwarg:
+        argument_map[params.kwarg.arg] = {}
+    positional_only = {arg.arg for arg in params.posonlyargs}
+    for arg_name, value in call_kwargs.items():
+        if isinstance(arg_name, tuple):
+            argument_map[params.kwarg.arg][arg_name] = value
+        elif arg_name in keyword_only or arg_name in positional and arg_name not in positional_only:
+            if arg_name in argument_map:
+                raise TypeError(f'{name}() got multiple values for argument {arg_name!r}')
+            argument_map[arg_name] = value
+        elif params.kwarg:
+            argument_map[params.kwarg.arg][arg_name] = value
+        else:
+            raise TypeError(f'{name}() got an unexpected keyword argument {arg_name!r}')
+    if unpacked:
+        if any(arg_name not in argument_map for arg_name in positional + keyword_only
+               if arg_name not in positional_only):
+            raise TypeError(f'**{ast.unparse(unpacked[0])} cannot be bound without running the code')
+        kwargs = argument_map[params.kwarg.arg]
+        argument_map[params.kwarg.arg] = ast.Dict(keys=[None if isinstance(key, tuple) else ast.Constant(value=key)
+                                                        for key in kwargs], values=list(kwargs.values()))
+    defaults = dict(zip(positional[len(positional) - len(params.defaults):], params.defaults))
+    defaults.update((arg.arg, default) for arg, default in zip(params.kwonlyargs, params.kw_defaults) if default)
+    missing = []
+    for arg_name in positional + keyword_only:
+        if arg_name not in argument_map:
+            if arg_name in defaults:
+                argument_map[arg_name] = defaults[arg_name]
+            else:
+                missing.append(arg_name)
+    if missing:
+        raise TypeError(f'{name}() missing required arguments: {", ".join(map(repr, missing))}')
+    if not copy:
+        return argument_map
+    return {arg_name: copy_ast(value) if isinstance(value, ast.AST) else value
+            for arg_name, value in argument_map.items()}
+
+
+def inline_function(func_def: FunctionNode, argument_map: dict, ret_var_name: str) -> str:
+    """The steps of inline_src on a static argument map: rename collisions, bind arguments, assign the return."""
+    func_def = copy_ast(func_def)
+    func_def.decorator_list = []
+    var_to_new_var = refresh_var_names(func_def, sorted(extract_arg_names(argument_map)))
+    prepend_assignments(func_def, argument_map, var_to_new_var)
+    replace_return_with_assignment(func_def, ret_var_name)
+    return ast.unparse(func_def.body)
+
+
+class StaticResolver:
+    """Finds the definition a dotted callee refers to in a file, following imports within bound_path."""
+
+    def __init__(self, bound_path: str = '.'):
+        self.bound_path = bound_path
+        self.scopes: Dict[str, ModuleScope] = {}
+
+    def scope(self, file: str) -> ModuleScope:
+        if file not in self.scopes:
+            with open(file, 'r') as src_file:
+                self.scopes[file] = module_scope(ast.parse(src_file.read(), file))
+        return self.scopes[file]
+
+    def _module_file(self, module: str, level: int, file: str) -> Optional[str]:
+        if level:  # the package a relative `from . import x` refers to
+            return get_static_src_file(Import(f"from {'.' * level}{module or ''} import *", '*', module, level), file)
+        return get_static_src_file(Import(f'import {module}', module), file)
+
+    def resolve(self, file: str, parts: List[str], visited: List[str] = None) -> Tuple[str, FunctionNode, List[str]]:
+        """(definition file, function node, files read on the way), LookupError if it cannot be done statically."""
+        visited = [] if visited is None else visited
+        if file is None or not is_sub_path(file, self.bound_path):
+            raise LookupError(f'{".".join(parts)} is not defined within {self.bound_path}')
+        if len(visited) > 20:
+            raise LookupError(f'{".".join(parts)}: import chain too long')
+        file = os.path.abspath(file)
+        visited.append(file)
+        scope = self.scope(file)
+        head, rest = parts[0], parts[1:]
+        if head in scope.defs:
+            node = scope.defs[head]
+            for attr in rest:
+                if not isinstance(node, ast.ClassDef):
+                    raise LookupError(f'{".".join(parts)}: {attr} is not looked up on a class')
+                node = next((item for item in node.body if getattr(item, 'name', None) == attr), None)
+                if node is None:
+                    raise LookupError(f'{".".join(parts)}: no {attr} in the class body')
+            if isinstance(node, ast.AsyncFunctionDef):
+                raise LookupError(f'{".".join(parts)} is a coroutine function')
+            if not isinstance(node, ast.FunctionDef):
+                raise LookupError(f'{".".join(parts)} is not a function')
+            if rest and not any(isinstance(dec, ast.Name) and dec.id == 'staticmethod' for dec in node.decorator_list):
+                raise LookupError(f'{".".join(parts)} is a method, only static methods are inlined through the class')
+            return file, node, visited
+        if head in scope.imported:
+            imp = scope.imported[head]
+            module_file = self._module_file(imp.module, imp.level, file)
+            if module_file and imp.obj in self.scope(module_file).defs | self.scope(module_file).imported:
+                return self.resolve(module_file, [imp.obj] + rest, visited)
+            return self.resolve(get_static_src_file(imp, file), rest, visited)  # imported a submodule
+        if head in scope.modules:
+            module_parts = scope.modules[head].split('.') + rest
+            for i in range(len(module_parts) - 1, 0, -1):  # longest module prefix, the rest is looked up in it
+                module_file = self._module_file('.'.join(module_parts[:i]), 0, file)
+                if module_file is not None:
+                    return self.resolve(module_file, module_parts[i:], visited)
+        raise LookupError(f'{".".join(parts)} is not defined or imported in {file}')
+
+
+def callee_name(call: ast.Call) -> Optional[str]:
+    """`f` / `mod.f` / `Class.method`, None for callees that are not a plain dotted name."""
+    node = call.func
+    while isinstance(node, ast.Attribute):
+        node = node.value
+    return ast.unparse(call.func) if isinstance(node, ast.Name) else None
+
+
+def inline_calls_in_file(file: str, targets: Iterable[str] = None, lines: Iterable[int] = None,
+                         bound_path: str = '.', resolver: StaticResolver = None) -> Tuple[List[InlinedCall], List[str]]:
+    """
+    Inline every call site in `file` whose callee (as written, e.g. `add_func` or `mock_module.add_func`) is in
+    `targets`, restricted to calls starting on `lines` if given. Without targets every call that resolves to a
+    first party function is inlined and unresolvable ones are skipped silently.
+    Returns the results in source order and the files the results depend on.
+    """
+    file = os.path.abspath(file)
+    targets = set(targets) if targets is not None else None
+    lines = set(lines) if lines is not None else None
+    resolver = resolver or StaticResolver(bound_path)
+    with open(file, 'r') as src_file:
+        tree = ast.parse(src_file.read(), file)
+    results, depends = [], {file: None}
+    calls = sorted((node for node in ast.walk(tree) if isinstance(node, ast.Call)),
+                   key=lambda node: (node.lineno, node.col_offset))
+    for call in calls:
+        func = callee_name(call)
+        if func is None or targets is not None and func not in targets or lines is not None and call.lineno not in lines:
+            continue
+        site = dict(file=file, lineno=call.lineno, col_offset=call.col_offset, call=ast.unparse(call), func=func)
+        try:
+            def_file, func_def, visited = resolver.resolve(file, func.split('.'))
+        except LookupError as error:
+            if targets is not None:
+                results.append(InlinedCall(**site, problem=str(error)))
+            continue
+        depends.update(dict.fromkeys(visited))
+        try:
+            argument_map = bind_arguments(func_def, call)
+        except TypeError as error:
+            results.append(InlinedCall(**site, def_file=def_file, problem=str(error)))
+            continue
+        ret_var = func.split('.')[-1] + '_ret'
+        code = inline_function(func_def, argument_map, ret_var)
+        results.append(InlinedCall(**site, def_file=def_file, code=code, ret_var=ret_var))
+    return results, list(depends)
+
+
+class InlineCache:
+    """
+    Results of inline_calls_in_file per file and request (targets, lines, bound path), stored as json in
+    cache_file. An entry is fresh while the file and every file its definitions came from keep their mtime and size.
+    """
+    version = 1
+
+    def __init__(self, cache_file: str = '.batch_inline_cache.json'):
+        self.cache_file = cache_file
+        self.hits = 0
+        self.misses = 0
+        self.entries: Dict[str, dict] = {}
+        self._dirty = False
+        try:
+            with open(cache_file, 'r') as file:
+                data = json.load(file)
+            if data.get('version') == self.version:
+                self.entries = data['files']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    @staticmethod
+    def request_key(targets: Iterable[str] = None, lines: Iterable[int] = None, bound_path: str = '.') -> str:
+        request = [sorted(targets) if targets is not None else None, sorted(lines) if lines is not None else None,
+                   os.path.abspath(bound_path)]
+        return hashlib.sha1(json.dumps(request).encode()).hexdigest()
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[list]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_mtime_ns, st.st_size]
+
+    def get(self, path: str, key: str) -> Optional[List[InlinedCall]]:
+        entry = self.entries.get(path, {}).get(key)
+        if entry is None or any(self._stamp(dep) != stamp for dep, stamp in entry['depends'].items()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [InlinedCall(*result) for result in entry['results']]
+
+    def put(self, path: str, key: str, results: List[InlinedCall], depends: List[str]):
+        self.entries.setdefault(path, {})[key] = {'depends': {dep: self._stamp(dep) for dep in depends},
+                                                  'results': [list(result) for result in results]}
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        tmp_file = f'{self.cache_file}.tmp'
+        with open(tmp_file, 'w') as file:
+            json.dump({'version': self.version, 'files': self.entries}, file)
+        os.replace(tmp_file, self.cache_file)
+        self._dirty = False
+
+
+def _inline_file_task(file: str, targets: Optional[List[str]], lines: Optional[List[int]], bound_path: str) -> tuple:
+    """Process pool task, a resolver per task keeps the workers stateless."""
+    try:
+        return inline_calls_in_file(file, targets, lines, bound_path)
+    except (OSError, SyntaxError, UnicodeDecodeError) as error:
+        return [InlinedCall(file, 0, 0, '', '', problem=f'{type(error).__name__}: {error}')], [file]
+
+
+def inline_files(files: Iterable[str], targets: Iterable[str] = None, lines: Iterable[int] = None,
+                 bound_path: str = '.', cache: InlineCache = None, workers: int = None) -> Dict[str, List[InlinedCall]]:
+    """
+    inline_calls_in_file over many files, {file: results} in the order given. Files with a fresh cache entry
+    are not read, with workers > 1 the others are processed in a process pool.
+    """
+    files = list(dict.fromkeys(os.path.abspath(file) for file in files))
+    targets = sorted(targets) if targets is not None else None
+    lines = sorted(lines) if lines is not None else None
+    key = InlineCache.request_key(targets, lines, bound_path)
+    found = {}
+    if cache is not None:
+        for file in files:
+            if (results := cache.get(file, key)) is not None:
+                found[file] = results
+    misses = [file for file in files if file not in found]
+    task = partial(_inline_file_task, targets=targets, lines=lines, bound_path=bound_path)
+    if workers is not None and workers > 1 and len(misses) >= workers:
+        with ProcessPoolExecutor(workers) as pool:
+            done = list(pool.map(task, misses, chunksize=max(1, len(misses) // (workers * 4))))
+    else:
+        done = [task(file) for file in misses]
+    for file, (results, depends) in zip(misses, done):
+        found[file] = results
+        if cache is not None:
+            cache.put(file, key, results, depends)
+    if cache is not None:
+        cache.save()
+    return {file: found[file] for file in files}
+
+
+def package_files(path: str) -> List[str]:
+    """path itself if it is a file, else every .py file below it, skipping hidden directories and __pycache__."""
+    if os.path.isfile(path):
+        return [path]
+    files = glob.glob(os.path.join(path, '**', '*.py'), recursive=True)
+    return sorted(file for file in files if not any(part.startswith('.') and part not in ('.', '..')
+                                                    or part == '__pycache__'
+                                                    for part in os.path.relpath(file, path).split(os.sep)))
+
+
+def inline_package(path: str, targets: Iterable[str] = None, lines: Iterable[int] = None, bound_path: str = '.',
+                   cache: InlineCache = None, workers: int = None) -> Dict[str, List[InlinedCall]]:
+    return inline_files(package_files(path), targets, lines, bound_path, cache, workers)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='inline call sites without running the code')
+    parser.add_argument('paths', nargs='+', help='python files or package directories')
+    parser.add_argument('-t', '--target', action='append', dest='targets',
+                        help='callee as written at the call site, e.g. add_func or mock_module.add_func')
+    parser.add_argument('-l', '--line', action='append', type=int, dest='lines', help='only calls starting on line')
+    parser.add_argument('--bound-path', default='.')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+    files = [file for path in args.paths for file in package_files(path)]
+    cache = None if args.no_cache else InlineCache()
+    inlined = inline_files(files, args.targets, args.lines, args.bound_path, cache, args.workers)
+    if args.json:
+        print(json.dumps({file: [result._asdict() for result in results] for file, results in inlined.items()
+                          if results}, indent=1))
+    else:
+        for file, results in inlined.items():
+            for result in results:
+                print(f'# ------------------ {os.path.relpath(file)}:{result.lineno}  {result.call}')
+                print(result.code if result.ok else f'# not inlined: {result.problem}')
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from dep_crawl import get_src_files
+from dep_daemon import DepClient, query, start_daemon
+
+
+def generate_tree(root: str, n_modules: int, fan_out: int = 3):
+    """main.py imports mod_0, mod_i imports the next `fan_out` modules, relative imports so no sys.path is needed."""
+    for i in range(n_modules):
+        imports = ''.join(f'from . import mod_{j}\n' for j in range(i + 1, min(i + 1 + fan_out, n_modules)))
+        with open(os.path.join(root, f'mod_{i}.py'), 'w') as file:
+            file.write(imports + f'\ndef func_{i}():\n    return {i}\n')
+    with open(os.path.join(root, 'main.py'), 'w') as file:
+        file.write('from . import mod_0\n')
+
+
+if __name__ == '__main__':
+    for n_modules in (100, 1000, 5000):
+        with tempfile.TemporaryDirectory() as root:
+            generate_tree(root, n_modules)
+            main = os.path.join(root, 'main.py')
+            socket_path = os.path.join(root, 'dep.sock')
+            cold_cli = min(timeit.repeat(lambda: subprocess.run(
+                [sys.executable, '-c', f'from dep_crawl import get_src_files; get_src_files({main!r}, {root!r}, static=True)'],
+                check=True, cwd=Path(__file__).resolve().parents[1]), number=1, repeat=3))
+            cold = min(timeit.repeat(lambda: get_src_files(main, root, static=True), number=1, repeat=3))
+            process = start_daemon(socket_path)
+            try:
+                assert len(query('closure', socket_path, file=main, bound_path=root)) == n_modules
+                one_shot = min(timeit.repeat(lambda: query('closure', socket_path, file=main, bound_path=root),
+                                             number=10, repeat=3)) / 10
+                with DepClient(socket_path) as client:
+                    kept = min(timeit.repeat(lambda: client.query('rdeps', file=main, bound_path=root,
+                                                                  target=os.path.join(root, 'mod_5.py')),
+                                             number=10, repeat=3)) / 10
+            finally:
+                process.terminate()
+                process.wait()
+            print(f'{n_modules:>6} modules  cold process: {cold_cli * 1000:8.1f} ms  cold call: {cold * 1000:8.1f} ms'
+                  f'  daemon closure: {one_shot * 1000:6.2f} ms  daemon rdeps (open client): {kept * 1000:6.2f} ms')
@@ -0,0 +1,57 @@
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from dep_crawl import Import, extract_imports, import_model
+
+HEADER = '''import os
+import sys
+import json
+from typing import Any, Dict, List, Optional
+from collections import OrderedDict, defaultdict
+from . import {siblings}
+'''
+
+
+def generate_tree(root: str, n_files: int):
+    for i in range(n_files):
+        siblings = ', '.join(f'mod_{j}' for j in range(i + 1, min(i + 20, n_files))) or 'os'
+        with open(os.path.join(root, f'mod_{i}.py'), 'w') as file:
+            file.write(HEADER.format(siblings=siblings) + f'\ndef func_{i}():\n    import re\n    return {i}\n')
+
+
+def crawl(files, record) -> list:
+    """Crawl-shaped workload: parse every file and keep all of its import records alive."""
+    if record is None:
+        return [extract_imports(file) for file in files]
+    return [[record(**imp._asdict()) for imp in extract_imports(file)] for file in files]
+
+
+def measure(files, record) -> tuple:
+    gc.collect()
+    start = time.perf_counter()
+    n_records = sum(map(len, crawl(files, record)))
+    seconds = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()  # separate run, tracing would inflate the timing
+    kept = crawl(files, record)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return seconds, size, n_records
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as root:
+        n_files = 10_000
+        generate_tree(root, n_files)
+        files = [os.path.join(root, f'mod_{i}.py') for i in range(n_files)]
+        for name, record in (('pydantic model', import_model()), ('NamedTuple', None)):
+            seconds, size, n_records = measure(files, record)
+            print(f'{name:>15}: {n_records} records  {seconds:6.2f} s  {size / 2 ** 20:7.1f} MiB retained')
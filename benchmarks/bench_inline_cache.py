@@ -0,0 +1,35 @@
+import contextlib
+import io
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from icecream import ic
+
+from ast_inline import call_node_cache, clear_ast_caches, inline_src, source_ast_cache
+from mockeries.mock_module import A, add_func
+
+
+def inline_many(n: int, cold: bool):
+    a = A()
+    x = 1
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        for _ in range(n):
+            if cold:
+                clear_ast_caches()
+            inline_src(add_func([1], x, 1, 2, 3, k={3: 4}))
+            inline_src(a.p(2))
+
+
+if __name__ == '__main__':
+    n = 200
+    for ic_enabled in (True, False):  # ic's colorized report printing is a fixed cost on top of the inliner
+        ic.enabled = ic_enabled
+        for cold in (True, False):
+            clear_ast_caches()
+            seconds = min(timeit.repeat(lambda: inline_many(n, cold), number=1, repeat=3))
+            print(f'ic {"on " if ic_enabled else "off"} {"cold" if cold else "cached":>6}: '
+                  f'{seconds / (2 * n) * 1000:6.3f} ms per inline_src call'
+                  f'  (source hits {source_ast_cache.hits}, call node hits {call_node_cache.hits})')
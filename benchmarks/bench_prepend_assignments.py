@@ -0,0 +1,50 @@
+import ast
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from ast_inline import parse_obj_to_ast_node, prepend_assignments
+
+
+def prepend_assignments_reparse(func_def, argument_map, pre_map):
+    """The previous implementation: unparse every value and parse `name = value` back, kept as the reference."""
+    for arg_name, val in argument_map.items():
+        new_var = pre_map.get(arg_name, arg_name)
+        if isinstance(val, ast.AST):
+            func_def.body.insert(0, ast.parse(f'{new_var} = {ast.unparse(val)}'))
+        elif isinstance(val, tuple):
+            func_def.body.insert(0, ast.parse(f'{new_var} = {ast.unparse(ast.Tuple(elts=val))}'))
+        elif isinstance(val, dict):
+            dict_ast = ast.Dict(keys=[ast.Constant(k) for k in val.keys()], values=list(val.values()))
+            func_def.body.insert(0, ast.parse(f'{new_var} = {ast.unparse(dict_ast)}'))
+
+
+def argument_map(n: int) -> dict:
+    """Shaped like get_argument_map output for f(data, *args, **kwargs) called with big literals."""
+    return {'data': parse_obj_to_ast_node([{'id': i, 'tags': [str(i), i * 0.5]} for i in range(n)]),
+            'args': tuple(parse_obj_to_ast_node(i) for i in range(n)),
+            'kwargs': {f'k{i}': parse_obj_to_ast_node((i, None)) for i in range(n)}}
+
+
+def run(prepend, n: int) -> ast.FunctionDef:
+    func_def = ast.parse('def f(data, *args, **kwargs):\n    return data').body[0]
+    prepend(func_def, argument_map(n), {'data': 'data_'})
+    return func_def
+
+
+if __name__ == '__main__':
+    for n in (100, 1000, 10000):
+        assert ast.unparse(run(prepend_assignments, n)) == ast.unparse(run(prepend_assignments_reparse, n))
+        base = min(timeit.repeat(lambda: argument_map(n), number=1, repeat=3))
+        results = []
+        for prepend in (prepend_assignments_reparse, prepend_assignments):
+            seconds = min(timeit.repeat(lambda: run(prepend, n), number=1, repeat=3)) - base
+            tracemalloc.start()
+            run(prepend, n)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results.append(f'{prepend.__name__}: {seconds * 1000:7.1f} ms {peak / 2 ** 20:6.1f} MiB peak')
+        print(f'{n:>6} elements  ' + '  '.join(results))
@@ -0,0 +1,46 @@
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from dep_crawl import parse_imports
+
+BLOCK = '''
+
+def func_{i}(a, b=3, *args, **kwargs):
+    """docstring with an import os line
+    import not_a_module
+    """
+    import json
+    try:
+        from collections import OrderedDict as od_{i}
+    except ImportError:
+        od_{i} = dict
+    values = [x ** 2 for x in range(a) if x % 2]  # import comment
+    text = 'from fake import thing'
+    return sum(values) + b + len(text) + len(od_{i}())
+
+
+class Klass{i}:
+    attr = {{'k': ({i}, 2, 3), 'v': [1, 2, 3]}}
+
+    def method(self, x):
+        from os import path
+        return path.join(str(x), self.attr['k'])
+'''
+
+
+def generate_source(n_blocks: int) -> str:
+    header = 'import os\nimport sys\nfrom typing import Any, Dict\n'
+    return header + ''.join(BLOCK.format(i=i) for i in range(n_blocks))
+
+
+if __name__ == '__main__':
+    for n_blocks in (100, 1000, 5000):
+        source = generate_source(n_blocks)
+        assert parse_imports(source, scanner='fast') == parse_imports(source)
+        n_lines = source.count('\n')
+        for scanner in ('ast', 'fast', 'toplevel', 'header'):
+            seconds = min(timeit.repeat(lambda: parse_imports(source, scanner=scanner), number=1, repeat=5))
+            print(f'{n_lines:>7} lines  {scanner:>8}: {seconds * 1000:8.2f} ms')
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import marshal
+import os
+import zipfile
+from importlib.util import MAGIC_NUMBER, source_hash
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+from dep_crawl import get_src_files
+
+MANIFEST_NAME = '__bundle_manifest__.json'
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)  # fixed timestamps keep identical inputs byte identical
+
+
+class BundleResult(NamedTuple):
+    output: str
+    manifest: dict
+    rebuilt: bool  # False when the manifest matched and the archive was left alone
+
+
+def arc_name(file: str, root: str) -> str:
+    rel_path = os.path.relpath(os.path.abspath(file), os.path.abspath(root))
+    if rel_path.startswith('..'):
+        raise ValueError(f'{file} is outside of the bundle root {root}')
+    return rel_path.replace(os.sep, '/')
+
+
+def to_pyc(source: bytes, filename: str, optimize: int) -> bytes:
+    """
+    Unchecked hash based pyc: the header holds the source hash instead of its mtime, so a checkout with other
+    mtimes builds the same bytes. zipimport never checks it against a source that is not in the archive.
+    """
+    code = compile(source, filename, 'exec', dont_inherit=True, optimize=optimize)
+    return MAGIC_NUMBER + (0b01).to_bytes(4, 'little') + source_hash(source) + marshal.dumps(code)
+
+
+def collect_files(entry: str, bound_path: str, root: str) -> List[str]:
+    """Entry first, then its closure plus the __init__.py of every package on the way (imported implicitly)."""
+    root = Path(root).resolve()
+    files = {os.path.abspath(entry): None}
+    crawl = list(files)
+    for file in crawl:
+        closure = [os.path.abspath(path) for path in get_src_files(file, bound_path, is_abs=False, static=True)]
+        for path in [file] + closure:
+            files.setdefault(path, None)
+            for package in Path(path).resolve().parents:
+                if not package.is_relative_to(root) or package == root:
+                    break
+                init_file = str(package / '__init__.py')
+                if init_file not in files and os.path.isfile(init_file):
+                    files[init_file] = None
+                    crawl.append(init_file)
+    return list(files)
+
+
+def main_source(entry_name: str) -> bytes:
+    """
+    __main__ of the archive for an entry at arc name entry_name: an entry inside a package runs as that package's
+    module, so its relative imports resolve, a top level entry is its own __main__.
+    """
+    module = entry_name[:-len('.py')].replace('/', '.')
+    return f'import runpy\nrunpy.run_module({module!r}, run_name="__main__", alter_sys=True)\n'.encode()
+
+
+def build_manifest(entry: str, files: List[str], root: str, optimize: int) -> dict:
+    hashes = {}
+    for file in files:
+        with open(file, 'rb') as src_file:
+            hashes[arc_name(file, root)] = hashlib.sha256(src_file.read()).hexdigest()
+    return {'python': MAGIC_NUMBER.hex(), 'optimize': optimize, 'entry': arc_name(entry, root), 'files': hashes}
+
+
+def _write_entry(archive: zipfile.ZipFile, name: str, data: bytes):
+    info = zipfile.ZipInfo(name, ZIP_DATE)
+    if name.endswith('/'):
+        info.external_attr = 0o40755 << 16 | 0x10
+    else:
+        info.external_attr = 0o644 << 16
+        info.compress_type = zipfile.ZIP_DEFLATED
+    archive.writestr(info, data)
+
+
+def bundle(entry: str, output: str = None, bound_path: str = '.', root: str = None, optimize: int = 0,
+           interpreter: str = None, force=False) -> BundleResult:
+    """
+    Compile the entry file and its first party closure (dep_crawl, static resolution) into one zip archive
+    of .pyc files that zipimport loads without touching the source tree. The entry also becomes __main__, so
+    `python output` runs it like the original script, an entry inside a package like `python -m package.entry`.
+    Module paths are relative to `root` (default bound_path), i.e. `root` is the sys.path entry the archive replaces.
+    A manifest of source hashes is written next to the archive and the build is skipped when nothing changed.
+    """
+    root = root or bound_path
+    output = output or os.path.splitext(os.path.basename(entry))[0] + '.pyz'
+    files = collect_files(entry, bound_path, root)
+    manifest = build_manifest(entry, files, root, optimize)
+    manifest['interpreter'] = interpreter
+    manifest_file = f'{output}.manifest.json'
+    if not force and os.path.exists(output) and os.path.exists(manifest_file):
+        with open(manifest_file, 'r') as file:
+            if json.load(file) == manifest:
+                return BundleResult(output, manifest, False)
+
+    entries: Dict[str, bytes] = {}
+    for file in files:
+        with open(file, 'rb') as src_file:
+            source = src_file.read()
+        name = arc_name(file, root)
+        pyc = to_pyc(source, name, optimize)
+        entries[name[:-len('.py')] + '.pyc'] = pyc
+        if file == files[0]:
+            entries['__main__.pyc'] = pyc if '/' not in name else \
+                to_pyc(main_source(name), '__main__.py', optimize)
+        parts = name.split('/')[:-1]
+        for i in range(1, len(parts) + 1):  # directory entries, zipimport needs them for namespace packages
+            entries.setdefault('/'.join(parts[:i]) + '/', b'')
+    entries[MANIFEST_NAME] = json.dumps(manifest, indent=1, sort_keys=True).encode()
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    tmp_output = f'{output}.tmp'
+    with open(tmp_output, 'wb') as file:
+        if interpreter:
+            file.write(f'#!{interpreter}\n'.encode())
+        with zipfile.ZipFile(file, 'w') as archive:
+            for name in sorted(entries):
+                _write_entry(archive, name, entries[name])
+    if interpreter:
+        os.chmod(tmp_output, 0o755)
+    os.replace(tmp_output, output)
+    with open(manifest_file, 'w') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    return BundleResult(output, manifest, True)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="bundle a script's first party closure into a compiled zipapp")
+    parser.add_argument('entry')
+    parser.add_argument('-o', '--output')
+    parser.add_argument('--bound-path', default='.')
+    parser.add_argument('--root')
+    parser.add_argument('--optimize', type=int, default=0)
+    parser.add_argument('--python', dest='interpreter', help='shebang interpreter, e.g. "/usr/bin/env python3"')
+    parser.add_argument('--force', action='store_true')
+    args = parser.parse_args()
+    result = bundle(args.entry, args.output, args.bound_path, args.root, args.optimize, args.interpreter, args.force)
+    print(f'{result.output}: {len(result.manifest["files"])} modules, {"built" if result.rebuilt else "up to date"}')
@@ -1,39 +1,187 @@
 import ast
+import glob
+import hashlib
 import inspect
+import json
 import os
+import re
 import sys
-from functools import reduce
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, reduce
+from importlib.machinery import ModuleSpec, PathFinder
+from importlib.util import decode_source
 from pathlib import Path
 from types import FunctionType, MethodType, ModuleType
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
 
-from pydantic import BaseModel
 
-
-class Import(BaseModel):
+class Import(NamedTuple):
+    """One imported name, `from .a import b` -> Import(stmt='from .a import b', obj='b', module='a', level=1)."""
     stmt: str
-    module: Optional[str] = None
     obj: str
+    module: Optional[str] = None
+    level: int = 0
+
+
+@lru_cache(maxsize=None)
+def import_model() -> type:
+    """
+    pydantic model with the fields of Import, for callers that want validation or JSON serialization:
+    import_model()(**imp._asdict()).model_dump_json(). pydantic is only imported on the first call.
+    """
+    from pydantic import BaseModel
+
+    class ImportModel(BaseModel):
+        stmt: str
+        obj: str
+        module: Optional[str] = None
+        level: int = 0
+
+        def to_import(self) -> Import:
+            return Import(self.stmt, self.obj, self.module, self.level)
 
+    return ImportModel
 
-def extract_imports(file_path) -> List[Import]:
+
+def extract_imports(file_path, scanner: str = 'ast') -> List[Import]:
     with open(file_path, 'r') as file:
-        tree = ast.parse(file.read(), filename=file_path)
+        return parse_imports(file.read(), file_path, scanner)
+
+
+SCANNERS = {'ast': None, 'fast': (True, False), 'toplevel': (False, False), 'header': (False, True)}
+
+_SCAN_PATTERN = re.compile(
+    r"(?P<string>[rRbBuUfF]{0,2}(?:'''[^'\\]*(?:(?:\\[\s\S]|'(?!''))[^'\\]*)*'''"
+    r'|"""[^"\\]*(?:(?:\\[\s\S]|"(?!""))[^"\\]*)*"""'
+    r"|'[^'\\\n]*(?:\\[\s\S][^'\\\n]*)*'"
+    r'|"[^"\\\n]*(?:\\[\s\S][^"\\\n]*)*"))'
+    r'|(?P<comment>#[^\n]*)'
+    r'|^(?P<indent>[ \t]*)'
+    r'(?P<prefix>(?:if|elif|else|try|except|finally|with|for|while|case|def|class|async)\b[^\n#]*:[ \t]*)?'
+    r'(?P<keyword>import|from)\b'
+    r'|^(?P<stop>(?:async[ \t]+)?def\b|class\b|@)'
+    r'|^(?P<statement>[^ \t\r\n#])'
+    r'|(?P<split>;|\\\r?\n)',
+    re.MULTILINE)
+_KEYWORD_PATTERN = re.compile(r'[ \t]*(import|from)\b')
+_DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def parse_imports(source: str | bytes, file_path: str = '<unknown>', scanner: str = 'ast') -> List[Import]:
+    """
+    scanner='ast' parses the whole module, the other SCANNERS lex the source for import statements only:
+    'fast' finds every import including ones nested in functions / try blocks, 'toplevel' only module level
+    imports (those in module level if / try / with blocks included) and 'header' only the module level imports
+    before the first def / class.
+    """
+    if scanner == 'ast':
+        nodes = ast_import_nodes(source, file_path=file_path)
+    else:
+        nested, header_only = SCANNERS[scanner]
+        nodes = scan_import_nodes(source, nested, header_only)
 
     imports = []
-    for node in ast.walk(tree):
+    for node in nodes:
         if isinstance(node, ast.Import):
             for alias in node.names:
                 stmt = f"import {alias.name}"
                 imports.append(Import(stmt=stmt, obj=alias.name))
-        elif isinstance(node, ast.ImportFrom):
+        else:
             for alias in node.names:
-                stmt = f"from {node.module} import {alias.name}"
-                imports.append(Import(stmt=stmt, module=node.module, obj=alias.name))
+                stmt = f"from {'.' * node.level}{node.module or ''} import {alias.name}"
+                imports.append(Import(stmt=stmt, module=node.module, obj=alias.name, level=node.level))
 
     return imports
 
 
+def _statement_end(source: str, pos: int) -> int:
+    depth = 0
+    while pos < len(source):
+        char = source[pos]
+        if char == '#':
+            pos = source.find('\n', pos)
+            if pos == -1:
+                break
+            continue
+        if char == '\\':
+            pos += 2
+            continue
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth -= 1
+        elif char in '\n;' and depth <= 0:
+            return pos
+        pos += 1
+    return len(source)
+
+
+def scan_import_nodes(source: str | bytes, nested=True, header_only=False) -> List[ast.stmt]:
+    """
+    Lex the source for import statements, skipping strings and comments, and parse only those statements.
+    Returns the import nodes in source order without building the module's ast. Imports in module level
+    if / try / with blocks count as module level. Where the lexer cannot tell what an import belongs to
+    (`x = 1; import a`, a header continued with a backslash, an indented import outside a def / class)
+    the whole module is parsed instead, see ast_import_nodes.
+    """
+    if isinstance(source, bytes):
+        source = decode_source(source)
+    nodes = []
+    in_definition = False  # the last statement at column 0 started a def / class
+    parsed_to = 0  # end of the last import statement parsed
+    for match in _SCAN_PATTERN.finditer(source):
+        if match.start() < parsed_to:
+            continue
+        if match['split'] is not None:
+            return ast_import_nodes(source, nested, header_only)
+        if match['statement'] is not None:
+            in_definition = False
+            continue
+        prefix = match['prefix'] or ''
+        if match['stop'] is not None or not match['indent'] and prefix.startswith(('def', 'class', 'async')):
+            if header_only:
+                break
+            in_definition = True
+        elif not match['indent']:
+            in_definition = False
+        if match['keyword'] is None or not nested and in_definition:
+            continue
+        if not nested and match['indent']:  # in a def nested in a module level block, or in the block itself
+            return ast_import_nodes(source, nested, header_only)
+        start = match.start('keyword')
+        while True:  # `import a; import b`
+            end = _statement_end(source, start)
+            try:
+                nodes.extend(ast.parse(source[start:end]).body)
+            except SyntaxError:  # a colon inside the compound header fooled the prefix match
+                return ast_import_nodes(source, nested, header_only)
+            if end >= len(source) or source[end] != ';' or not (next_match := _KEYWORD_PATTERN.match(source, end + 1)):
+                break
+            start = next_match.start(1)
+        parsed_to = end
+    return [node for node in nodes if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def ast_import_nodes(source: str | bytes, nested=True, header_only=False,
+                     file_path: str = '<unknown>') -> List[ast.stmt]:
+    """The import nodes of the parsed module in source order, nested and header_only as in scan_import_nodes."""
+    todo = []
+    for stmt in ast.parse(source, filename=file_path).body:
+        if header_only and isinstance(stmt, _DEFINITIONS):
+            break
+        todo.append(stmt)
+    nodes = []
+    while todo:
+        node = todo.pop()
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            nodes.append(node)
+        elif nested or not isinstance(node, _DEFINITIONS):
+            todo.extend(ast.iter_child_nodes(node))
+    return sorted(nodes, key=lambda node: (node.lineno, node.col_offset))
+
+
 def is_builtin_module(module_name):
     return module_name in sys.builtin_module_names
 
@@ -52,7 +200,64 @@ def get_module_src_file(imp: Import) -> str | None:
     return inspect.getfile(value)
 
 
-def get_src_file(imp: Import) -> str | None:
+def find_module_spec(module: str, search_path: List[str] = None) -> ModuleSpec | None:
+    """Locate a (dotted) module with the path finders alone, parent packages are never imported."""
+    spec = None
+    for name in module.split('.'):
+        if spec is not None:
+            search_path = spec.submodule_search_locations
+            if search_path is None:  # parent is a plain module, not a package
+                return None
+        spec = PathFinder.find_spec(name, search_path)
+        if spec is None:
+            return None
+    return spec
+
+
+def spec_src_file(spec: ModuleSpec | None) -> str | None:
+    if spec is None or not spec.has_location:
+        return None
+    return os.path.abspath(spec.origin)
+
+
+def get_static_src_file(imp: Import, file: str = None) -> str | None:
+    """
+    Resolve an import to its source file without executing anything:
+    `import a.b` -> a/b.py, `from a import b` -> a/b.py if b is a submodule else a/__init__.py,
+    relative imports are resolved against the directory of `file`.
+    """
+    if imp.level:
+        if file is None:
+            raise ValueError(f'relative import `{imp.stmt}` needs the importing file to be resolved')
+        parents = Path(file).resolve().parents
+        # the top-level package is the outermost directory with an __init__.py, without one only the root stops
+        packages = [depth for depth, parent in enumerate(parents, 1) if (parent / '__init__.py').is_file()]
+        if imp.level > (packages[-1] if packages else len(parents)):  # beyond the top-level package
+            return None
+        pkg_dir = parents[imp.level - 1]
+        init_file = pkg_dir / '__init__.py'
+        search_path, src_file = [str(pkg_dir)], str(init_file) if init_file.is_file() else None
+        if imp.module is not None:
+            spec = find_module_spec(imp.module, search_path)
+            if spec is None:
+                return None
+            search_path, src_file = spec.submodule_search_locations, spec_src_file(spec)
+    elif imp.module is None:  # import a.b.c
+        return spec_src_file(find_module_spec(imp.obj))
+    else:
+        spec = find_module_spec(imp.module)
+        if spec is None:
+            return None
+        search_path, src_file = spec.submodule_search_locations, spec_src_file(spec)
+
+    if search_path and (sub_spec := find_module_spec(imp.obj, list(search_path))) is not None:
+        return spec_src_file(sub_spec)
+    return src_file
+
+
+def get_src_file(imp: Import, file: str = None, static: bool = False) -> str | None:
+    if static or imp.level:
+        return get_static_src_file(imp, file)
     states = {}
     exec(imp.stmt, states)
     obj = get_value_from_state_dict(imp.obj, states)
@@ -77,29 +282,580 @@ def to_relative_path(abs_path) -> str:
     return relative_path
 
 
-def get_src_files_rec(file: str, bound_path: str = '.', extracted: List[str] = None, is_abs=False) -> List[str]:
-    if extracted is None:
-        extracted = []
+class ImportResolver:
+    """Maps the imports of a file to the files they load within bound_path, memoized across files."""
+
+    def __init__(self, bound_path: str = '.', is_abs=False, static=False):
+        self.is_abs = is_abs
+        self.static = static
+        self.bound = Path(bound_path) if is_abs else Path(bound_path).resolve()
+        self.in_bound: Dict[str, bool] = {}
+        self.resolved: Dict[tuple, str | None] = {}  # imports of the same name resolve the same way in every file
+
+    @property
+    def context(self) -> str:
+        """Everything resolution depends on besides the file itself, used to key cached targets."""
+        key = json.dumps([self.static, str(self.bound), self.is_abs, sys.path])
+        return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    def resolve(self, file: str, imports: List[Import]) -> List[str]:
+        targets = []
+        for imp in imports:
+            key = (imp.stmt, os.path.dirname(file) if imp.level else None)
+            if key not in self.resolved:
+                self.resolved[key] = get_src_file(imp, file, self.static)
+            if (dst := self.resolved[key]) is None or dst in targets:
+                continue
+            if dst not in self.in_bound:
+                self.in_bound[dst] = (Path(dst) if self.is_abs else Path(dst).resolve()).is_relative_to(self.bound)
+            if self.in_bound[dst]:
+                targets.append(dst)
+        return targets
+
+
+class ParseCache:
+    """
+    Persistent cache of extract_imports results and resolved targets, stored as json in cache_file.
+    An entry is fresh while the file's mtime and size match, a touched file with unchanged content
+    (same size and sha256) is still a hit. Changed files are re-parsed and their entry replaced.
+    Resolved targets are kept per resolver context (bound path, sys.path) for static resolution only: in exec
+    mode they also depend on the code of the imported modules. A cached target that disappeared invalidates
+    them, a newly added module shadowing an old target does not, call clear() for that.
+    """
+    version = 2
+
+    def __init__(self, cache_file: str = '.dep_crawl_cache.json'):
+        self.cache_file = cache_file
+        self.hits = 0
+        self.misses = 0
+        self.entries: Dict[str, dict] = {}
+        self._stats: Dict[str, os.stat_result | None] = {}
+        self._dirty = False
+        try:
+            with open(cache_file, 'r') as file:
+                data = json.load(file)
+            if data.get('version') == self.version:
+                self.entries = data['files']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def begin(self):
+        """Forget stat results of the previous crawl, every file is stat-ed at most once per crawl."""
+        self._stats.clear()
+
+    def stat(self, path: str) -> os.stat_result | None:
+        if path not in self._stats:
+            try:
+                self._stats[path] = os.stat(path)
+            except OSError:
+                self._stats[path] = None
+        return self._stats[path]
+
+    def _fresh_entry(self, path: str) -> dict | None:
+        entry = self.entries.get(path)
+        st = self.stat(path)
+        if entry is None or st is None or entry['size'] != st.st_size:
+            return None
+        if entry['mtime_ns'] != st.st_mtime_ns:
+            with open(path, 'rb') as file:
+                if hashlib.sha256(file.read()).hexdigest() != entry['hash']:
+                    return None
+            entry['mtime_ns'] = st.st_mtime_ns
+            self._dirty = True
+        return entry
+
+    def get_imports(self, path: str, scanner: str = 'ast') -> List[Import]:
+        if (entry := self._fresh_entry(path)) is not None and entry['scanner'] == scanner:
+            self.hits += 1
+            return [Import(stmt, obj, module, level) for stmt, module, obj, level in entry['imports']]
+        self.misses += 1
+        with open(path, 'rb') as file:
+            source = file.read()
+        imports = parse_imports(source, path, scanner)
+        self.put_imports(path, imports, hashlib.sha256(source).hexdigest(), scanner)
+        return imports
+
+    def put_imports(self, path: str, imports: List[Import], source_hash: str, scanner: str = 'ast'):
+        st = self.stat(path)
+        self.entries[path] = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'hash': source_hash,
+                              'scanner': scanner,
+                              'imports': [[imp.stmt, imp.module, imp.obj, imp.level] for imp in imports],
+                              'targets': {}}
+        self._dirty = True
+
+    def get_targets(self, path: str, context: str) -> List[str] | None:
+        entry = self._fresh_entry(path)
+        if entry is None or (targets := entry['targets'].get(context)) is None:
+            return None
+        if any(self.stat(target) is None for target in targets):
+            return None
+        self.hits += 1
+        return targets
+
+    def set_targets(self, path: str, context: str, targets: List[str]):
+        self.entries[path]['targets'][context] = targets
+        self._dirty = True
+
+    def clear(self):
+        self.entries = {}
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        tmp_file = f'{self.cache_file}.tmp'
+        with open(tmp_file, 'w') as file:
+            json.dump({'version': self.version, 'files': self.entries}, file)
+        os.replace(tmp_file, self.cache_file)
+        self._dirty = False
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+_worker_resolver: ImportResolver | None = None
+_worker_scanner = 'ast'
+
+
+def _init_scan_worker(bound_path: str, is_abs: bool, static: bool, scanner: str):
+    global _worker_resolver, _worker_scanner
+    _worker_resolver = ImportResolver(bound_path, is_abs, static)
+    _worker_scanner = scanner
+
+
+def _scan_file(path: str) -> tuple:
+    """Process pool task: parse and resolve one file, returns (targets, imports, source hash)."""
+    with open(path, 'rb') as file:
+        source = file.read()
+    imports = parse_imports(source, path, _worker_scanner)
+    return _worker_resolver.resolve(path, imports), imports, hashlib.sha256(source).hexdigest()
+
+
+def crawl_src_files(file: str | Iterable[str], bound_path: str = '.', is_abs=False, static=False,
+                    cache: ParseCache = None, workers: int = None, scanner: str = 'ast') -> Dict[str, List[str]]:
+    """
+    Breadth-first crawl of the import graph in waves, every file is parsed exactly once with `scanner`.
+    With workers > 1 the files of a wave are parsed and resolved in a process pool, results are merged in
+    wave order so the output is identical to the serial crawl.
+    `file` can also be several entry files crawled together.
+    Returns {file: [imported files within bound_path]} in discovery order, keyed by absolute path.
+    """
+    files = [file] if isinstance(file, str) else file
+    roots = list(dict.fromkeys(os.path.abspath(path) for path in files if is_sub_path(path, bound_path, is_abs)))
+    if not roots:
+        return {}
+    resolver = ImportResolver(bound_path, is_abs, static)
+    if cache is not None:
+        cache.begin()
+        context = f'{resolver.context}:{scanner}' if static else None  # see ParseCache
+    pool = None
+    if workers is not None and workers > 1:
+        pool = ProcessPoolExecutor(workers, initializer=_init_scan_worker,
+                                   initargs=(bound_path, is_abs, static, scanner))
+
+    graph: Dict[str, List[str]] = {}
+    visited = set(roots)
+    wave = roots
+    try:
+        while wave:
+            found: Dict[str, List[str]] = {}
+            if cache is not None:
+                for src in wave:
+                    if context and (targets := cache.get_targets(src, context)) is not None:
+                        found[src] = targets
+            misses = [src for src in wave if src not in found]
+            if pool is not None and len(misses) >= workers:  # small waves are cheaper in process
+                chunksize = max(1, len(misses) // (workers * 4))
+                for src, (targets, imports, source_hash) in zip(misses, pool.map(_scan_file, misses,
+                                                                                  chunksize=chunksize)):
+                    if cache is not None:
+                        cache.misses += 1
+                        cache.put_imports(src, imports, source_hash, scanner)
+                        if context:
+                            cache.set_targets(src, context, targets)
+                    found[src] = targets
+            else:
+                for src in misses:
+                    if cache is None:
+                        found[src] = resolver.resolve(src, extract_imports(src, scanner))
+                    else:
+                        found[src] = resolver.resolve(src, cache.get_imports(src, scanner))
+                        if context:
+                            cache.set_targets(src, context, found[src])
+
+            next_wave = []
+            for src in wave:
+                graph[src] = found[src]
+                for dst in found[src]:
+                    if dst not in visited:
+                        visited.add(dst)
+                        next_wave.append(dst)
+            wave = next_wave
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if cache is not None:
+        cache.save()
+    return graph
+
+
+class DependencyGraph:
+    """
+    Immutable import graph over interned file ids with array backed (CSR) forward and reverse adjacency.
+    Paths are absolute, ids follow crawl discovery order.
+    """
+    __slots__ = ('paths', 'ids', 'roots', '_fwd_offsets', '_fwd_targets', '_rev_offsets', '_rev_targets')
+
+    def __init__(self, paths: List[str], edges: Iterable[tuple], roots: Iterable[int] = ()):
+        self.paths = paths
+        self.ids = {path: i for i, path in enumerate(paths)}
+        self.roots = list(roots)
+        edges = list(edges)
+        self._fwd_offsets, self._fwd_targets = self._to_csr(len(paths), edges)
+        self._rev_offsets, self._rev_targets = self._to_csr(len(paths), [(dst, src) for src, dst in edges])
+
+    @staticmethod
+    def _to_csr(n: int, edges: List[tuple]) -> tuple:
+        offsets = array('l', [0]) * (n + 1)
+        for src, _ in edges:
+            offsets[src + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+        targets = array('l', [0]) * len(edges)
+        fill = offsets[:-1]
+        for src, dst in edges:
+            targets[fill[src]] = dst
+            fill[src] += 1
+        return offsets, targets
+
+    @classmethod
+    def from_adjacency(cls, adjacency: Dict[str, List[str]], roots: Iterable[str] = ()) -> 'DependencyGraph':
+        paths = list(adjacency)
+        ids = {path: i for i, path in enumerate(paths)}
+        for targets in adjacency.values():
+            for dst in targets:
+                if dst not in ids:
+                    ids[dst] = len(paths)
+                    paths.append(dst)
+        edges = [(ids[src], ids[dst]) for src, targets in adjacency.items() for dst in targets]
+        roots = [os.path.abspath(root) for root in roots]
+        return cls(paths, edges, [ids[root] for root in roots if root in ids])
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.abspath(path) in self.ids
+
+    def id_of(self, path: str) -> int:
+        return self.ids[os.path.abspath(path)]
+
+    def _imports(self, i: int, reverse=False) -> array:
+        offsets, targets = (self._rev_offsets, self._rev_targets) if reverse else (self._fwd_offsets, self._fwd_targets)
+        return targets[offsets[i]:offsets[i + 1]]
+
+    def imports(self, path: str) -> List[str]:
+        return [self.paths[j] for j in self._imports(self.id_of(path))]
+
+    def importers(self, path: str) -> List[str]:
+        return [self.paths[j] for j in self._imports(self.id_of(path), reverse=True)]
+
+    def edges(self) -> Iterable[tuple]:
+        for i, path in enumerate(self.paths):
+            for j in self._imports(i):
+                yield path, self.paths[j]
+
+    def closure_ids(self, ids: Iterable[int], reverse=False) -> List[int]:
+        """ids reachable through at least one edge, in breadth-first order"""
+        visited = bytearray(len(self.paths))
+        queue = [j for i in ids for j in self._imports(i, reverse)]
+        reached = []
+        for i in queue:
+            if visited[i]:
+                continue
+            visited[i] = 1
+            reached.append(i)
+            queue.extend(self._imports(i, reverse))
+        return reached
+
+    def closure(self, paths: str | Iterable[str], reverse=False) -> List[str]:
+        """Transitive imports of `paths`, or with reverse=True every file that transitively imports them."""
+        paths = [paths] if isinstance(paths, str) else paths
+        return [self.paths[i] for i in self.closure_ids([self.id_of(path) for path in paths], reverse)]
+
+    def shortest_chain(self, src: str, dst: str) -> List[str] | None:
+        """Shortest import chain src -> ... -> dst, None if dst is not reachable."""
+        src_id, dst_id = self.id_of(src), self.id_of(dst)
+        parents = array('l', [-1]) * len(self.paths)
+        queue = [src_id]
+        for i in queue:
+            for j in self._imports(i):
+                if parents[j] != -1 or j == src_id:
+                    continue
+                parents[j] = i
+                if j == dst_id:
+                    chain = [j]
+                    while chain[-1] != src_id:
+                        chain.append(parents[chain[-1]])
+                    return [self.paths[k] for k in reversed(chain)]
+                queue.append(j)
+        return None
+
+    def strongly_connected_components(self) -> List[List[str]]:
+        """Iterative Tarjan, components come out dependencies first."""
+        n = len(self.paths)
+        index = array('l', [-1]) * n
+        low = array('l', [0]) * n
+        on_stack = bytearray(n)
+        stack, components, counter = [], [], 0
+        for start in range(n):
+            if index[start] != -1:
+                continue
+            work = [(start, 0)]
+            while work:
+                i, pos = work.pop()
+                if pos == 0:
+                    index[i] = low[i] = counter
+                    counter += 1
+                    stack.append(i)
+                    on_stack[i] = 1
+                targets = self._imports(i)
+                while pos < len(targets):
+                    j = targets[pos]
+                    pos += 1
+                    if index[j] == -1:
+                        work.append((i, pos))
+                        work.append((j, 0))
+                        break
+                    if on_stack[j]:
+                        low[i] = min(low[i], index[j])
+                else:
+                    if low[i] == index[i]:
+                        component = []
+                        while True:
+                            j = stack.pop()
+                            on_stack[j] = 0
+                            component.append(self.paths[j])
+                            if j == i:
+                                break
+                        components.append(component)
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[i])
+        return components
+
+    def cycles(self) -> List[List[str]]:
+        """Import cycles, i.e. components with more than one file or a file importing itself."""
+        return [component for component in self.strongly_connected_components()
+                if len(component) > 1 or component[0] in self.imports(component[0])]
+
+    def topological_order(self) -> List[str]:
+        """Every file comes after the files it imports, members of a cycle are kept adjacent."""
+        return [path for component in self.strongly_connected_components() for path in component]
+
+
+def build_dependency_graph(file: str, bound_path: str = '.', is_abs=False, static=False,
+                           cache: ParseCache = None, workers: int = None, scanner: str = 'ast') -> DependencyGraph:
+    adjacency = crawl_src_files(file, bound_path, is_abs, static, cache, workers, scanner)
+    return DependencyGraph.from_adjacency(adjacency, roots=[file])
+
+
+def get_src_files(file: str, bound_path: str = '.', is_abs=False, static=False, cache: ParseCache = None,
+                  workers: int = None, scanner: str = 'ast') -> List[str]:
+    """
+    static=True resolves imports from sys.path and the package layout instead of executing them,
+    cache=ParseCache(path) reuses parsed imports and resolved targets of unchanged files across runs,
+    workers=n parses and resolves in a pool of n processes,
+    scanner picks the import extraction, see parse_imports.
+    """
     if not is_sub_path(file, bound_path, is_abs):
         return []
-    imports = extract_imports(file)
-    src_files = []
-    for imp in imports:
-        if (src_file := get_src_file(imp)) is not None:
-            if not is_sub_path(src_file, bound_path, is_abs):
-                continue
-            if src_file not in src_files + extracted:
-                src_files.append(src_file)
-    extracted = list(set(src_files + extracted))
-    final_src_files = []
-    for src_file in src_files:
-        sub_src_files = get_src_files_rec(src_file, bound_path, extracted, is_abs)
-        final_src_files.extend(sub_src_files)
-    return list(set(final_src_files + extracted))
-
-
-def get_src_files(file: str, bound_path: str = '.', is_abs=False) -> List[str]:
-    files = get_src_files_rec(file, bound_path, [], is_abs)
+    graph = build_dependency_graph(file, bound_path, is_abs, static, cache, workers, scanner)
+    files = graph.closure(file)
     if is_abs:
         return files
     return [to_relative_path(file) for file in files]
+
+
+def select_affected_tests(changed: Iterable[str], tests: str | Iterable[str] = 'tests/test_*.py',
+                          bound_path: str = '.', static=True, cache: ParseCache = None, workers: int = None,
+                          scanner: str = 'ast') -> List[str]:
+    """
+    Test modules (a glob pattern or a list of files) whose transitive imports contain any of the changed files,
+    a changed test module selects itself. All tests are crawled together so shared modules are parsed once.
+    """
+    test_files = sorted(glob.glob(tests, recursive=True)) if isinstance(tests, str) else list(tests)
+    graph = DependencyGraph.from_adjacency(crawl_src_files(test_files, bound_path, False, static, cache, workers,
+                                                           scanner), roots=test_files)
+    changed_ids = [graph.id_of(path) for path in changed if path in graph]
+    affected = set(changed_ids).union(graph.closure_ids(changed_ids, reverse=True))
+    return [to_relative_path(graph.paths[i]) for i in graph.roots if i in affected]
+
+
+class CrawlDelta(NamedTuple):
+    added: List[str]  # files that entered the crawl result
+    removed: List[str]  # files that left it
+    reparsed: List[str]  # files whose imports were extracted again
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.reparsed)
+
+
+def _import_names(imp: Import) -> set:
+    names = set(imp.obj.split('.'))
+    if imp.module:
+        names.update(imp.module.split('.'))
+    return names
+
+
+class IncrementalCrawl:
+    """
+    A crawl kept in memory that is updated for changed / added / deleted files instead of re-crawled:
+    only changed files are re-parsed, and only files whose imports may resolve differently are re-resolved.
+    poll() detects the changes itself from file and directory mtimes, watch() polls in a loop.
+    """
+
+    def __init__(self, file: str, bound_path: str = '.', is_abs=False, static=False, scanner: str = 'ast'):
+        self.root = os.path.abspath(file)
+        self.bound_path = bound_path
+        self.is_abs = is_abs
+        self.static = static
+        self.scanner = scanner
+        self.resolver = ImportResolver(bound_path, is_abs, static)
+        self.imports: Dict[str, List[Import]] = {}
+        self.adjacency: Dict[str, List[str]] = {}
+        self.mtimes: Dict[str, Optional[int]] = {}
+        self.dir_mtimes: Dict[str, int] = {}
+        self.dir_files: Dict[str, set] = {}  # .py files of each polled directory when it was last listed
+        self._files: List[str] = []
+        self._graph: DependencyGraph | None = None
+        if is_sub_path(file, bound_path, is_abs):
+            self._crawl([self.root])
+            self._files = self._reachable()
+
+    def _parse(self, path: str):
+        mtime = os.stat(path).st_mtime_ns
+        self.mtimes[path] = None  # until it parses: a file saved mid-edit is retried by the next poll()
+        self.imports[path] = extract_imports(path, self.scanner)
+        self.mtimes[path] = mtime
+        directory = os.path.dirname(path)
+        if directory not in self.dir_mtimes:
+            self.dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+            self.dir_files[directory] = {os.path.join(directory, name) for name in os.listdir(directory)
+                                         if name.endswith('.py')}
+
+    def _crawl(self, paths: Iterable[str]):
+        worklist = [path for path in paths if path not in self.adjacency]
+        for src in worklist:
+            if src in self.adjacency:
+                continue
+            self._parse(src)
+            self.adjacency[src] = self.resolver.resolve(src, self.imports[src])
+            worklist.extend(dst for dst in self.adjacency[src] if dst not in self.adjacency)
+
+    def _reachable(self) -> List[str]:
+        """Closure of the root in breadth-first order, nodes that fell out of it are dropped."""
+        visited = set()
+        reached = []
+        queue = list(self.adjacency.get(self.root, []))
+        for path in queue:
+            if path in visited:
+                continue
+            visited.add(path)
+            reached.append(path)
+            queue.extend(self.adjacency.get(path, []))
+        visited.add(self.root)
+        for path in list(self.adjacency):
+            if path not in visited:
+                for table in (self.adjacency, self.imports, self.mtimes):
+                    table.pop(path, None)
+        return reached
+
+    @property
+    def graph(self) -> DependencyGraph:
+        if self._graph is None:
+            self._graph = DependencyGraph.from_adjacency(self.adjacency, roots=[self.root])
+        return self._graph
+
+    def files(self) -> List[str]:
+        """Same result as get_src_files for the current state of the tree."""
+        if self.is_abs:
+            return list(self._files)
+        return [to_relative_path(file) for file in self._files]
+
+    def update(self, changed: Iterable[str] = (), added: Iterable[str] = (), deleted: Iterable[str] = ()) -> CrawlDelta:
+        changed = {os.path.abspath(path) for path in changed}
+        added = {os.path.abspath(path) for path in added} | {path for path in changed if path not in self.adjacency}
+        deleted = {os.path.abspath(path) for path in deleted}
+        changed -= added | deleted
+
+        reparse = {path for path in changed if path in self.adjacency}
+        resolve = set(reparse)
+        if added or deleted:  # the file system layout changed, imports of other files may resolve differently
+            self.resolver.resolved.clear()
+            self.resolver.in_bound.clear()
+            for path in deleted:
+                resolve.update(src for src, targets in self.adjacency.items() if path in targets)
+                for table in (self.adjacency, self.imports, self.mtimes):
+                    table.pop(path, None)
+            new_names = set()
+            for path in added:
+                stem = Path(path).stem
+                new_names.add(Path(path).parent.name if stem == '__init__' else stem)
+            resolve.update(src for src, imports in self.imports.items()
+                           if any(_import_names(imp) & new_names for imp in imports))
+        if self.root in deleted:
+            resolve.clear()
+
+        for path in reparse:
+            self._parse(path)
+        for path in resolve:
+            if path in self.imports:
+                self.adjacency[path] = self.resolver.resolve(path, self.imports[path])
+                self._crawl(self.adjacency[path])
+
+        before = set(self._files)
+        self._files = self._reachable() if self.root in self.adjacency else []
+        after = set(self._files)
+        self._graph = None
+        return CrawlDelta(added=sorted(after - before), removed=sorted(before - after), reparsed=sorted(reparse))
+
+    def poll(self) -> CrawlDelta:
+        """
+        Find changed / deleted tracked files and new .py files in the directories of tracked files. A file is new
+        once: untracked files already listed by an earlier poll are not added again.
+        """
+        changed, deleted, added = [], [], []
+        for path, mtime in self.mtimes.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    changed.append(path)
+            except FileNotFoundError:
+                deleted.append(path)
+        for directory, mtime in list(self.dir_mtimes.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                del self.dir_mtimes[directory]
+                self.dir_files.pop(directory, None)
+                continue
+            if current == mtime:
+                continue
+            self.dir_mtimes[directory] = current
+            for root, dirs, files in os.walk(directory):
+                listed = {os.path.join(root, name) for name in files if name.endswith('.py')}
+                added.extend(path for path in sorted(listed - self.dir_files.get(root, set()))
+                             if path not in self.mtimes)
+                self.dir_files[root] = listed
+                if root != directory:  # new sub packages are walked, known directories are polled on their own
+                    continue
+                dirs[:] = [name for name in dirs if os.path.join(root, name) not in self.dir_mtimes
+                           and not name.startswith('.') and name != '__pycache__']
+        return self.update(changed=changed, added=added, deleted=deleted)
+
+    def watch(self, callback: Callable[[CrawlDelta], Any], interval: float = 1.0, stop: threading.Event = None):
+        """Poll every `interval` seconds and call back with each non empty delta, until `stop` is set."""
+        stop = stop or threading.Event()
+        while not stop.wait(interval):
+            if delta := self.poll():
+                callback(delta)
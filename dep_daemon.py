@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict
+
+from dep_crawl import IncrementalCrawl
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f'dep_daemon-{os.getuid()}.sock')
+log = logging.getLogger(__name__)
+
+
+class CrawlStore:
+    """
+    Resident IncrementalCrawl per (entry file, options), refreshed by polling in a background thread. `lock`
+    guards the crawls and locks tables, each crawl has a lock of its own.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.crawls: Dict[tuple, IncrementalCrawl] = {}
+        self.locks: Dict[tuple, threading.Lock] = {}
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.watcher = threading.Thread(target=self._watch, daemon=True)
+        self.watcher.start()
+
+    def _watch(self):
+        while not self.stop.wait(self.interval):
+            with self.lock:
+                crawls = list(self.crawls.items())
+            for key, crawl in crawls:
+                try:
+                    with self.locks[key]:
+                        crawl.poll()
+                except Exception:  # e.g. a file saved mid-edit, the crawl retries it on the next poll
+                    log.exception('polling %s failed', key[0])
+
+    def get(self, file: str, bound_path: str = '.', static=True, scanner: str = 'ast',
+            refresh=False) -> tuple:
+        key = (os.path.abspath(file), os.path.abspath(bound_path), static, scanner)
+        with self.lock:
+            if key not in self.locks:
+                self.locks[key] = threading.Lock()
+        lock = self.locks[key]
+        with lock:
+            if key not in self.crawls:
+                crawl = IncrementalCrawl(key[0], key[1], is_abs=True, static=static, scanner=scanner)
+                with self.lock:
+                    self.crawls[key] = crawl
+            elif refresh:
+                self.crawls[key].poll()
+            crawl = self.crawls[key]
+            return crawl, crawl.graph
+
+    def stats(self) -> list:
+        with self.lock:
+            crawls = list(self.crawls.items())
+        stats = []
+        for key, crawl in crawls:
+            with self.locks[key]:
+                stats.append({'file': key[0], 'bound_path': key[1], 'files': len(crawl.adjacency)})
+        return stats
+
+
+def handle_request(store: CrawlStore, request: dict) -> Any:
+    op = request.pop('op')
+    if op == 'ping':
+        return 'pong'
+    if op == 'stats':
+        return {'crawls': store.stats()}
+    targets = {name: request.pop(name) for name in ('target', 'src', 'dst') if name in request}
+    crawl, graph = store.get(**request)
+    if op == 'closure':
+        return crawl.files()
+    if op in ('importers', 'rdeps') and targets['target'] not in graph:
+        return []
+    if op == 'importers':
+        return graph.importers(targets['target'])
+    if op == 'rdeps':
+        return graph.closure(targets['target'], reverse=True)
+    if op == 'cycles':
+        return graph.cycles()
+    if op == 'chain':
+        return graph.shortest_chain(targets['src'], targets['dst'])
+    raise ValueError(f'unknown op {op!r}')
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = {'result': handle_request(self.server.store, json.loads(line))}
+            except Exception as error:
+                response = {'error': f'{type(error).__name__}: {error}'}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
+class DepServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Answers JSON lines {"op": ..., "file": ..., ...} with {"result": ...} or {"error": ...}.
+    ops: ping, stats, closure, importers, rdeps (transitive importers), cycles, chain. Paths are absolute.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, interval: float = 1.0):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _Handler)
+        self.store = CrawlStore(interval)
+
+    def server_close(self):
+        super().server_close()
+        self.store.stop.set()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def serve(socket_path: str = DEFAULT_SOCKET, interval: float = 1.0):
+    with DepServer(socket_path, interval) as server:
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+
+class DepClient:
+    """Keeps one connection open, for callers that ask many questions in a row."""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.file = self.sock.makefile('rwb')
+
+    def query(self, op: str, **params) -> Any:
+        for name in ('file', 'bound_path', 'target', 'src', 'dst'):
+            if name in params:
+                params[name] = os.path.abspath(params[name])
+        self.file.write(json.dumps({'op': op, **params}).encode() + b'\n')
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def query(op: str, socket_path: str = DEFAULT_SOCKET, **params) -> Any:
+    """
+    One shot query, e.g. query('closure', file='main.py'), query('rdeps', file='main.py', target='util.py'),
+    query('cycles', file='main.py'), query('chain', file='main.py', src='main.py', dst='util.py').
+    """
+    with DepClient(socket_path) as client:
+        return client.query(op, **params)
+
+
+def start_daemon(socket_path: str = DEFAULT_SOCKET, interval: float = 1.0, timeout: float = 10.0) -> subprocess.Popen:
+    """Start `serve` in a detached process and wait until it answers."""
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'serve', '--socket', socket_path,
+                                '--interval', str(interval)], start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if query('ping', socket_path) == 'pong':
+                return process
+        except OSError:
+            time.sleep(0.02)
+    process.kill()
+    raise TimeoutError(f'dep daemon did not come up on {socket_path}')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='resident dep_crawl graphs behind a unix socket')
+    parser.add_argument('op', choices=['serve', 'closure', 'importers', 'rdeps', 'cycles', 'chain', 'stats'])
+    parser.add_argument('file', nargs='?')
+    parser.add_argument('target', nargs='?', help='file for importers / rdeps, destination for chain')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    parser.add_argument('--bound-path', default='.')
+    parser.add_argument('--interval', type=float, default=1.0)
+    args = parser.parse_args()
+    if args.op == 'serve':
+        serve(args.socket, args.interval)
+        sys.exit()
+    params = {} if args.op == 'stats' else {'file': args.file, 'bound_path': args.bound_path}
+    if args.op in ('importers', 'rdeps'):
+        params['target'] = args.target
+    elif args.op == 'chain':
+        params.update(src=args.file, dst=args.target)
+    result = query(args.op, args.socket, **params)
+    print(json.dumps(result, indent=1))
@@ -0,0 +1,406 @@
+import ast
+import builtins
+import cProfile
+import os
+import pstats
+import sys
+import time
+from types import CodeType, FunctionType
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from ast_inline import (VariablesRenameTransformer, copy_ast, evaluation_order, local_names, own_nodes,
+                        prepend_assignments, replace_return_with_assignment, statements)
+from batch_inline import StaticResolver, bind_arguments, callee_name
+from dep_crawl import is_sub_path, to_relative_path
+
+SIMPLE_STATEMENTS = (ast.Expr, ast.Assign, ast.AugAssign, ast.AnnAssign, ast.Return)
+# expressions that evaluate only some of their parts, or in a scope of their own
+UNSAFE_EXPRESSIONS = (ast.BoolOp, ast.IfExp, ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp,
+                      ast.NamedExpr, ast.Await, ast.Yield, ast.YieldFrom)
+
+
+class HotFunction(NamedTuple):
+    file: str
+    name: str
+    lineno: int  # line of the def
+    calls: int
+    own_us: int  # time spent in the body itself
+    size: int  # statements in the body
+    blockers: List[str]  # why it cannot be inlined, empty if it can
+
+    @property
+    def score(self) -> float:
+        """Call overhead saved grows with calls, code duplicated with size."""
+        return self.calls / max(self.size, 1)
+
+
+class InlineVariant(NamedTuple):
+    callee: HotFunction
+    caller_file: str
+    caller: str
+    lineno: int  # line of the call site
+    calls: int  # calls made from this caller while profiling
+    source: Optional[str] = None  # the caller with the call site inlined
+    before_s: Optional[float] = None  # best workload time with the original / the variant patched in
+    after_s: Optional[float] = None
+    problem: Optional[str] = None
+
+    @property
+    def speedup(self) -> Optional[float]:
+        return self.before_s / self.after_s if self.before_s and self.after_s else None
+
+
+def function_defs(tree: ast.Module) -> Dict[int, ast.FunctionDef]:
+    """Module level functions and methods by the line their code object starts on (first decorator if any)."""
+    defs = {}
+    for node in tree.body:
+        for func in [node] + (node.body if isinstance(node, ast.ClassDef) else []):
+            if isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                defs[func.decorator_list[0].lineno if func.decorator_list else func.lineno] = func
+    return defs
+
+
+def body_size(func: ast.FunctionDef) -> int:
+    body = func.body[1:] if ast.get_docstring(func) is not None else func.body
+    return sum(isinstance(node, ast.stmt) for stmt in body for node in ast.walk(stmt))
+
+
+def _immutable(value) -> bool:
+    if isinstance(value, tuple):
+        return all(map(_immutable, value))
+    return isinstance(value, (int, float, complex, str, bytes, type(None)))
+
+
+def immutable_default(node: ast.expr) -> bool:
+    """Whether a default is a literal of an immutable value, one that inlined code can spell out on every call."""
+    try:
+        return _immutable(ast.literal_eval(node))
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return False
+
+
+def inline_blockers(func: ast.AST) -> List[str]:
+    if isinstance(func, ast.AsyncFunctionDef):
+        return ['coroutine function']
+    blockers = set()
+    if not all(immutable_default(default) for default in func.args.defaults + func.args.kw_defaults
+               if default is not None):
+        blockers.add('default that is not an immutable literal')  # shared between calls, a copy would not be
+    last = func.body[-1]
+    for node in ast.walk(func):
+        if isinstance(node, (ast.Yield, ast.YieldFrom)):
+            blockers.add('generator')
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            blockers.add(f'{type(node).__name__.lower()} statement')
+        elif isinstance(node, ast.Return) and node is not last:
+            blockers.add('returns before its last statement')
+        elif isinstance(node, ast.Call) and callee_name(node) == func.name:
+            blockers.add('recursive')
+    return sorted(blockers)
+
+
+class HotInliner:
+    """
+    Profiles a workload, ranks small first party functions by calls per statement and inlines them into the
+    loops of their hottest callers. Each variant is compiled into the caller's module and the workload is timed
+    with the original and with the variant patched in.
+    """
+
+    def __init__(self, workload: Callable[[], Any], bound_path: str = '.', max_size: int = 8, repeat: int = 3):
+        self.workload = workload
+        self.bound_path = bound_path
+        self.max_size = max_size
+        self.repeat = repeat
+        self.resolver = StaticResolver(bound_path)
+        self.trees: Dict[str, ast.Module] = {}
+        self.stats: Dict[tuple, tuple] = {}
+
+    def tree(self, file: str) -> ast.Module:
+        if file not in self.trees:
+            with open(file, 'r') as src_file:
+                self.trees[file] = ast.parse(src_file.read(), file)
+        return self.trees[file]
+
+    def function_def(self, file: str, lineno: int) -> Optional[ast.FunctionDef]:
+        """The def whose code object starts on lineno, as reported by the profiler."""
+        return function_defs(self.tree(file)).get(lineno)
+
+    def callee_def(self, callee: HotFunction) -> ast.FunctionDef:
+        return next(func for func in function_defs(self.tree(callee.file)).values() if func.lineno == callee.lineno)
+
+    def profile(self) -> List[HotFunction]:
+        profiler = cProfile.Profile()
+        profiler.runcall(self.workload)
+        self.stats = pstats.Stats(profiler).stats
+        hot = []
+        for (file, lineno, name), (_, calls, own_s, _, _) in self.stats.items():
+            if not file.endswith('.py') or not os.path.isfile(file) or not is_sub_path(file, self.bound_path):
+                continue
+            file = os.path.abspath(file)
+            if (func := self.function_def(file, lineno)) is None or func.name != name:
+                continue
+            hot.append(HotFunction(file, name, func.lineno, calls, int(own_s * 1e6), body_size(func),
+                                   inline_blockers(func)))
+        return sorted(hot, key=lambda func: func.score, reverse=True)
+
+    def call_sites(self, callee: HotFunction) -> List[Tuple[str, ast.FunctionDef, ast.Call, int]]:
+        """(caller file, caller def, call node, calls from that caller) for every loop call site of callee."""
+        key = next(key for key in self.stats if os.path.isfile(key[0]) and os.path.abspath(key[0]) == callee.file
+                   and self.function_def(callee.file, key[1]) is self.callee_def(callee))
+        sites = []
+        for (file, lineno, _), (_, calls, _, _) in self.stats[key][4].items():
+            if not os.path.isfile(file) or not is_sub_path(file, self.bound_path):
+                continue
+            file = os.path.abspath(file)
+            if (caller := self.function_def(file, lineno)) is None:
+                continue
+            for body, _, stmt, in_loop in statements(caller.body):
+                if not in_loop:
+                    continue
+                for node in own_nodes(stmt):
+                    if not isinstance(node, ast.Call) or (func_name := callee_name(node)) is None:
+                        continue
+                    try:
+                        def_file, func_def, _ = self.resolver.resolve(file, func_name.split('.'))
+                    except LookupError:
+                        continue
+                    if def_file == callee.file and func_def.lineno == callee.lineno:
+                        sites.append((file, caller, node, calls))
+        return sorted(sites, key=lambda site: site[3], reverse=True)
+
+    def variant(self, callee: HotFunction, file: str, caller: ast.FunctionDef, call: ast.Call) -> ast.FunctionDef:
+        """Copy of caller with `call` replaced by the callee's body."""
+        caller = copy_ast(caller)
+        target = next((node for node in ast.walk(caller) if isinstance(node, ast.Call)
+                       and (node.lineno, node.col_offset) == (call.lineno, call.col_offset)), None)
+        if target is None:
+            raise LookupError('call site not found')
+        inline_call(caller, self.callee_def(callee), target)
+        return ast.fix_missing_locations(caller)
+
+    def time_workload(self) -> Tuple[float, Any]:
+        best, result = float('inf'), None
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = self.workload()
+            best = min(best, time.perf_counter() - start)
+        return best, result
+
+    def measure(self, file: str, caller: ast.FunctionDef, callee: HotFunction, variant: ast.FunctionDef) -> tuple:
+        """(before_s, after_s) with the variant patched over the live caller, the original is restored after."""
+        owner, attr, original, func = _live_function(file, caller)
+        callee_func = _live_function(callee.file, self.callee_def(callee))[3]
+        free = {node.id for node in ast.walk(variant) if isinstance(node, ast.Name)} - local_names(variant)
+        foreign = sorted(name for name in free if name in callee_func.__globals__ and not hasattr(builtins, name)
+                         and func.__globals__.get(name) is not callee_func.__globals__[name])
+        if foreign:
+            raise LookupError(f'{callee.name} uses names of its own module: {", ".join(foreign)}')
+        if func.__code__.co_freevars:
+            raise LookupError(f'{caller.name} is a closure')
+        new_func = _compile_function(variant, file, func)
+        before_s, before = self.time_workload()
+        setattr(owner, attr, type(original)(new_func) if isinstance(original, (staticmethod, classmethod))
+                else new_func)
+        try:
+            after_s, after = self.time_workload()
+        finally:
+            setattr(owner, attr, original)
+        if after != before:
+            raise LookupError('the workload returned a different result with the variant')
+        return before_s, after_s
+
+    def run(self, top: int = 5) -> List[InlineVariant]:
+        variants = []
+        hot = [func for func in self.profile() if not func.blockers and func.size <= self.max_size]
+        for callee in hot[:top]:
+            for file, caller, call, calls in self.call_sites(callee):
+                site = dict(callee=callee, caller_file=file, caller=caller.name, lineno=call.lineno, calls=calls)
+                try:
+                    variant = self.variant(callee, file, caller, call)
+                except (LookupError, TypeError) as error:
+                    variants.append(InlineVariant(**site, problem=str(error)))
+                    continue
+                source = ast.unparse(variant)
+                try:
+                    before_s, after_s = self.measure(file, caller, callee, variant)
+                except LookupError as error:
+                    variants.append(InlineVariant(**site, source=source, problem=str(error)))
+                    continue
+                variants.append(InlineVariant(**site, source=source, before_s=before_s, after_s=after_s))
+        return variants
+
+
+def inline_call(caller: ast.FunctionDef, callee_def: ast.FunctionDef, call: ast.Call, reserved: Set[str] = frozenset(),
+                callee_locals: Set[str] = None) -> List[ast.stmt]:
+    """
+    Replace `call`, a node of caller, by the body of callee_def inserted before its statement, in place. The
+    callee's locals are renamed apart as _{callee}_{name}, avoiding the names of caller and `reserved`, and its
+    return value lands in _{callee}_ret. callee_locals saves recomputing local_names(callee_def).
+    Returns the inserted statements. Raises LookupError when the call cannot be moved before its statement,
+    TypeError when it cannot be bound.
+    """
+    for body, i, stmt, _ in statements(caller.body):
+        if any(node is call for node in own_nodes(stmt)):
+            break
+    else:
+        raise LookupError('call site not found')
+    callee_def = copy_ast(callee_def)
+    # the argument nodes move over as they are, later calls in them can still be found and inlined
+    argument_map = bind_arguments(callee_def, call, copy=False)
+    argument_map = dict(sorted(argument_map.items(), key=lambda item: _call_position(call, item[1])))
+    taken = {node.id for node in ast.walk(caller) if isinstance(node, ast.Name)} | \
+            {node.arg for node in ast.walk(caller) if isinstance(node, ast.arg)} | set(reserved)
+
+    def fresh(name: str) -> str:
+        new_name = f'_{callee_def.name}_{name}'
+        while new_name in taken:
+            new_name += '_'
+        taken.add(new_name)
+        return new_name
+
+    if callee_locals is None:
+        callee_locals = local_names(callee_def)
+    # the inlined body reads its free names in the caller's scope, a local there would shadow the global
+    free = {node.id for node in ast.walk(callee_def) if isinstance(node, ast.Name)} - callee_locals
+    if shadowed := sorted(free & (local_names(caller) | set(reserved))):
+        raise LookupError(f'{", ".join(shadowed)} would read the caller\'s local instead of the global')
+    renames = {name: fresh(name) for name in sorted(callee_locals) if not name.startswith('global ')}
+    VariablesRenameTransformer(renames).visit(callee_def)
+    rebound = {node.id for stmt_node in callee_def.body for node in ast.walk(stmt_node)
+               if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load)}
+    if problem := _hoist_problem(stmt, call, rebound):
+        raise LookupError(problem)
+    ret_var = fresh('ret')
+    if not isinstance(callee_def.body[-1], ast.Return) or callee_def.body[-1].value is None:
+        callee_def.body.append(ast.Return(value=ast.Constant(value=None)))
+    replace_return_with_assignment(callee_def, ret_var)
+    # tracebacks point at the call site, not at lines of the caller's file that happen to share the callee's numbers
+    for node in ast.walk(callee_def):
+        if 'lineno' in node._attributes:
+            ast.copy_location(node, stmt)
+    prepend_assignments(callee_def, argument_map, renames)
+    _replace_node(stmt, call, ast.Name(id=ret_var, ctx=ast.Load()))
+    body[i:i] = callee_def.body
+    return callee_def.body
+
+
+def _call_position(call: ast.Call, value) -> int:
+    """Index in call of the first argument expression bound to a parameter, defaults after all of them."""
+    nodes = value if isinstance(value, tuple) else list(value.values()) if isinstance(value, dict) else [value]
+    arguments = {id(arg): i for i, arg in enumerate(call.args + [keyword.value for keyword in call.keywords])}
+    return min((arguments[id(node)] for top in nodes for node in ast.walk(top) if id(node) in arguments),
+               default=len(arguments))
+
+
+def _hoist_problem(stmt: ast.stmt, call: ast.Call, rebound: Set[str] = frozenset()) -> Optional[str]:
+    """
+    Why evaluating `call` before `stmt` could change what the statement does, None if it cannot. Whatever the
+    statement evaluates before the call has to be a constant or a name the inlined body (binding `rebound`)
+    leaves alone: an attribute, a subscript or an operator could see the state the body leaves behind.
+    """
+    if not isinstance(stmt, SIMPLE_STATEMENTS):
+        return f'call inside a {type(stmt).__name__} statement'
+    if stmt.value is None or not any(node is call for node in ast.walk(stmt.value)):
+        return 'call in an assignment target'
+    parents = {child: node for node in ast.walk(stmt) for child in ast.iter_child_nodes(node)}
+    ancestors = set()
+    node = call
+    while node is not stmt:
+        node = parents[node]
+        ancestors.add(node)
+    # the value is evaluated left to right, the targets of an augmented assignment before it
+    earlier = list(ast.walk(stmt.target)) if isinstance(stmt, ast.AugAssign) else []
+    for node in evaluation_order(stmt.value):
+        if node is call:
+            break
+        earlier.append(node)
+    for node in ast.walk(stmt):
+        if isinstance(node, UNSAFE_EXPRESSIONS):
+            return f'call next to a {type(node).__name__} expression'
+    for node in earlier:
+        if node in ancestors or not isinstance(node, ast.expr) or isinstance(node, ast.Constant):
+            continue
+        if not isinstance(node, ast.Name):
+            return f'a {type(node).__name__} before it in the statement would be evaluated after it'
+        if node.id in rebound:
+            return f'{node.id} before it in the statement is rebound by the inlined body'
+    return None
+
+
+def _replace_node(tree: ast.AST, old: ast.AST, new: ast.AST):
+    for node in ast.walk(tree):
+        for field, value in ast.iter_fields(node):
+            if value is old:
+                setattr(node, field, new)
+            elif isinstance(value, list) and any(item is old for item in value):
+                value[[item is old for item in value].index(True)] = new
+
+
+def _live_function(file: str, func_def: ast.FunctionDef) -> tuple:
+    """(owner, attribute, attribute value, function) of the loaded function defined by func_def in file."""
+    first_line = func_def.decorator_list[0].lineno if func_def.decorator_list else func_def.lineno
+    for module in list(sys.modules.values()):
+        module_file = getattr(module, '__file__', None)
+        if not module_file or os.path.abspath(module_file) != file:
+            continue
+        owners = [module] + [value for value in vars(module).values()
+                             if isinstance(value, type) and value.__module__ == module.__name__]
+        for owner in owners:
+            for attr, value in list(vars(owner).items()):
+                func = value.__func__ if isinstance(value, (staticmethod, classmethod)) else value
+                if isinstance(func, FunctionType) and func.__code__.co_name == func_def.name \
+                        and func.__code__.co_firstlineno == first_line:
+                    return owner, attr, value, func
+    raise LookupError(f'{func_def.name} is not loaded from {to_relative_path(file)}')
+
+
+def _compile_function(func_def: ast.FunctionDef, file: str, like: FunctionType) -> FunctionType:
+    """func_def compiled into the globals of `like`, with its defaults."""
+    func_def = copy_ast(func_def)
+    func_def.decorator_list = []
+    code = compile(ast.fix_missing_locations(ast.Module(body=[func_def], type_ignores=[])), file, 'exec')
+    func_code = next(const for const in code.co_consts if isinstance(const, CodeType))
+    new_func = FunctionType(func_code, like.__globals__, like.__name__, like.__defaults__)
+    new_func.__kwdefaults__ = like.__kwdefaults__
+    new_func.__qualname__ = like.__qualname__
+    new_func.__dict__.update(like.__dict__)
+    return new_func
+
+
+def hot_inline(workload: Callable[[], Any], bound_path: str = '.', top: int = 5, max_size: int = 8,
+               repeat: int = 3) -> List[InlineVariant]:
+    """Profile workload(), inline the `top` best small functions into their loop call sites and time each variant."""
+    return HotInliner(workload, bound_path, max_size, repeat).run(top)
+
+
+def report(variants: List[InlineVariant]) -> str:
+    lines = []
+    for variant in variants:
+        callee = variant.callee
+        lines.append(f'# ------------------------ {callee.name} ({callee.calls} calls, {callee.size} statements) '
+                     f'into {variant.caller} at {to_relative_path(variant.caller_file)}:{variant.lineno}')
+        if variant.problem:
+            lines.append(f'# not inlined: {variant.problem}')
+        else:
+            lines.append(f'# workload {variant.before_s * 1000:.2f} ms -> {variant.after_s * 1000:.2f} ms '
+                         f'({variant.speedup:.2f}x)')
+        if variant.source:
+            lines.append(variant.source)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    import importlib
+
+    parser = argparse.ArgumentParser(description='inline hot small functions into the loops that call them')
+    parser.add_argument('workload', help='module:function called without arguments, e.g. mockeries.hot_loop:workload')
+    parser.add_argument('--bound-path', default='.')
+    parser.add_argument('--top', type=int, default=5)
+    parser.add_argument('--max-size', type=int, default=8, help='largest body inlined, in statements')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    sys.path.insert(0, os.getcwd())
+    module_name, func_name = args.workload.split(':')
+    workload = getattr(importlib.import_module(module_name), func_name)
+    print(report(hot_inline(workload, args.bound_path, args.top, args.max_size, args.repeat)))
@@ -0,0 +1,200 @@
+import ast
+import os
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple, Optional
+
+from dep_crawl import DependencyGraph, build_dependency_graph, extract_imports, to_relative_path
+
+MARKER = '--- import_profile start ---'
+ENTRY = '__profiled__'
+
+# imports nothing the interpreter has not loaded at startup, an entry importing importlib or json pays for them
+PROFILE_SCRIPT = f'''
+import os, sys
+from _frozen_importlib import module_from_spec
+from _frozen_importlib_external import spec_from_file_location
+path, memory, name, root = sys.argv[1], sys.argv[2] == '1', sys.argv[3] or {ENTRY!r}, sys.argv[4]
+sys.path.insert(0, root or os.path.dirname(os.path.abspath(path)))
+if memory:
+    import tracemalloc
+    tracemalloc.start()
+preloaded = sorted(sys.modules)
+sys.stderr.write({MARKER!r} + '\\n')
+sys.stderr.flush()
+spec = spec_from_file_location(name, path)
+module = module_from_spec(spec)
+sys.modules[name] = module
+spec.loader.exec_module(module)
+sizes = {{}}
+if memory:
+    for stat in tracemalloc.take_snapshot().statistics('filename'):
+        sizes[stat.traceback[0].filename] = stat.size
+files = {{name: getattr(mod, '__file__', None) for name, mod in list(sys.modules.items())}}
+print(repr({{'memory': sizes, 'files': files, 'preloaded': preloaded}}))
+'''
+
+
+class ModuleCost(NamedTuple):
+    module: str
+    file: Optional[str]
+    self_us: int
+    cumulative_us: int
+    parent: Optional[str]  # module whose import first loaded this one, None for the entry file itself
+    memory: Optional[int] = None  # bytes allocated by the module's own code while importing
+
+
+def parse_importtime(stderr: str) -> List[tuple]:
+    """
+    `-X importtime` lines after MARKER as (module, self_us, cumulative_us, parent).
+    The output is post-order, children come before their parent one level deeper.
+    """
+    lines = stderr.split(MARKER, 1)[-1].splitlines()
+    entries, pending = [], {}
+    for line in lines:
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix('import time:').split('|', 2)
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        entry = [name.strip(), int(self_us), int(cumulative_us), None]
+        for child in pending.pop(depth + 1, []):
+            child[3] = entry[0]
+        pending.setdefault(depth, []).append(entry)
+        entries.append(entry)
+    return [tuple(entry) for entry in entries]
+
+
+def entry_module(file: str, bound_path: str = '.') -> Optional[str]:
+    """
+    Dotted name of file relative to bound_path, the package its relative imports resolve in as in dep_crawl.
+    None for a file at the top of bound_path or outside of it, which runs as a plain script.
+    """
+    rel_path = os.path.relpath(os.path.abspath(file), os.path.abspath(bound_path))
+    parts = rel_path[:-len('.py')].split(os.sep) if rel_path.endswith('.py') else []
+    if len(parts) < 2 or parts[0] == '..' or not all(part.isidentifier() for part in parts):
+        return None
+    return '.'.join(parts)
+
+
+class ImportProfile:
+    """
+    Per module import cost of an entry file joined with its dep_crawl graph. `preloaded` lists the modules the
+    closure imports that the interpreter had loaded before the entry ran: they cost nothing here, but would in
+    a process that does not load them at startup.
+    """
+
+    def __init__(self, file: str, costs: Dict[str, ModuleCost], graph: DependencyGraph,
+                 preloaded: List[str] = ()):
+        self.file = os.path.abspath(file)
+        self.costs = costs
+        self.graph = graph
+        self.preloaded = list(preloaded)
+        self.modules_by_file = {cost.file: cost.module for cost in costs.values() if cost.file}
+
+    @property
+    def total_us(self) -> int:
+        return sum(cost.cumulative_us for cost in self.costs.values() if cost.parent is None)
+
+    def chain(self, module: str) -> List[str]:
+        """Import chain from the entry file down to `module`, following who imported what first."""
+        chain = [module]
+        while (parent := self.costs[chain[-1]].parent) is not None:
+            chain.append(parent)
+        chain.append(to_relative_path(self.file))
+        return chain[::-1]
+
+    def top(self, n: int = 10, key: str = 'self_us') -> List[ModuleCost]:
+        return sorted(self.costs.values(), key=lambda cost: getattr(cost, key) or 0, reverse=True)[:n]
+
+    def edge_costs(self) -> Dict[tuple, int]:
+        """
+        Cumulative import time each dep_crawl edge (src file, dst file) brings in. Only the edge whose import
+        loaded the module first pays, later imports of the same module are cache hits and cost nothing.
+        """
+        costs = {}
+        for src, dst in self.graph.edges():
+            cost = self.costs.get(self.modules_by_file.get(dst))
+            parent = cost.parent if cost else None
+            first = cost is not None and (parent is None and src == self.file
+                                          or parent is not None and self.costs[parent].file == src)
+            costs[src, dst] = cost.cumulative_us if first else 0
+        return costs
+
+    def entry_edges(self) -> List[ModuleCost]:
+        """Every import the entry file triggers directly, first party or not, most expensive first."""
+        return sorted((cost for cost in self.costs.values() if cost.parent is None),
+                      key=lambda cost: cost.cumulative_us, reverse=True)
+
+    def report(self, n: int = 10) -> str:
+        lines = [f'# import cost of {to_relative_path(self.file)}: {self.total_us / 1000:.1f} ms',
+                 '# ------------------------ direct imports (cumulative):']
+        for cost in self.entry_edges()[:n]:
+            lines.append(f'{cost.cumulative_us / 1000:9.2f} ms  {cost.module}')
+        lines.append('# ------------------------ top offenders (self):')
+        for cost in self.top(n):
+            memory = f'  {cost.memory / 1024:8.1f} KiB' if cost.memory is not None else ''
+            chain = ' -> '.join(self.chain(cost.module))
+            lines.append(f'{cost.self_us / 1000:9.2f} ms{memory}  {cost.module}  <- {chain}')
+        if self.preloaded:
+            lines.append('# ------------------------ preloaded by the interpreter, not timed:')
+            lines.append(f'  {", ".join(self.preloaded)}')
+        return '\n'.join(lines)
+
+
+def run_importtime(file: str, memory=False, python: str = sys.executable, bound_path: str = '.') -> tuple:
+    """A file inside a package of bound_path runs as that package's module, see entry_module."""
+    module = entry_module(file, bound_path)
+    root = os.path.abspath(bound_path) if module else ''
+    result = subprocess.run([python, '-X', 'importtime', '-c', PROFILE_SCRIPT, file, '1' if memory else '0',
+                             module or '', root], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'importing {file} failed:\n{result.stderr.split(MARKER, 1)[-1]}')
+    return parse_importtime(result.stderr), ast.literal_eval(result.stdout.splitlines()[-1])
+
+
+def imported_names(files: List[str]) -> set:
+    """Every module name the import statements of files may load, parent packages included."""
+    names = set()
+    for file in files:
+        for imp in extract_imports(file):
+            if imp.level:
+                continue
+            dotted = f'{imp.module}.{imp.obj}' if imp.module else imp.obj
+            parts = dotted.split('.')
+            names.update('.'.join(parts[:i]) for i in range(1, len(parts) + 1))
+    return names
+
+
+def profile_imports(file: str, bound_path: str = '.', memory=False, python: str = sys.executable) -> ImportProfile:
+    """
+    Import `file` in a fresh interpreter under `-X importtime` and attach the per module cost to its
+    dep_crawl graph. With memory=True a second run under tracemalloc measures allocations per module,
+    kept apart so tracing does not inflate the timings.
+    """
+    entries, info = run_importtime(file, python=python, bound_path=bound_path)
+    sizes = {}
+    if memory:
+        _, memory_info = run_importtime(file, memory=True, python=python, bound_path=bound_path)
+        sizes = memory_info['memory']
+    costs = {}
+    for module, self_us, cumulative_us, parent in entries:
+        module_file = info['files'].get(module)
+        module_file = os.path.abspath(module_file) if module_file else None
+        costs[module] = ModuleCost(module, module_file, self_us, cumulative_us, parent,
+                                   sizes.get(module_file) if memory else None)
+    graph = build_dependency_graph(file, bound_path, static=True)
+    imported = imported_names(graph.paths)
+    return ImportProfile(file, costs, graph, [module for module in info['preloaded'] if module in imported])
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='per module import cost of a python file')
+    parser.add_argument('file')
+    parser.add_argument('--bound-path', default='.')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--memory', action='store_true')
+    args = parser.parse_args()
+    print(profile_imports(args.file, args.bound_path, args.memory).report(args.top))
@@ -0,0 +1,234 @@
+import ast
+import builtins
+import functools
+import inspect
+from collections import deque
+from types import CodeType, FunctionType, ModuleType
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from ast_inline import evaluation_order, get_source_ast, local_names, own_nodes, statements
+from batch_inline import callee_name
+from hot_inline import body_size, inline_blockers, inline_call
+
+MAX_SIZE = 8  # largest callee body inlined, in statements
+
+
+class Guard(NamedTuple):
+    """The inlined code is only valid while namespace[name] is still `expected`."""
+    namespace: Any  # module globals or a class __dict__
+    name: str
+    expected: Any
+
+
+class InlinedFunction(NamedTuple):
+    code: Optional[CodeType]  # None when nothing could be inlined
+    source: str
+    inlined: List[str]  # dotted names of the inlined calls, in source order
+    skipped: List[Tuple[str, str]]  # (dotted name, reason) of the calls left alone
+    guards: List[Guard]
+
+
+class CalleeTemplate(NamedTuple):
+    func_def: Optional[ast.FunctionDef]  # shared, inline_call works on a copy
+    local_names: Set[str]
+    problem: Optional[str]  # why it cannot be inlined, None if it can
+
+
+_compiled: Dict[Tuple[CodeType, int, int], InlinedFunction] = {}
+_templates: Dict[Tuple[CodeType, int], CalleeTemplate] = {}
+
+
+def resolve_callee(dotted_name: str, namespace: dict, unbound: bool = False) -> Tuple[FunctionType, List[Guard]]:
+    """
+    The function a call to dotted_name reaches from namespace, through modules and classes only. A plain function
+    reached through a class is a method called unbound, only taken with unbound=True.
+    """
+    parts = dotted_name.split('.')
+    if parts[0] not in namespace:
+        raise LookupError(f'{parts[0]} is not a module global')
+    owner, value = namespace, namespace[parts[0]]
+    guards = [Guard(owner, parts[0], value)]
+    for part in parts[1:]:
+        if not isinstance(value, (ModuleType, type)):
+            raise LookupError(f'{dotted_name} is an attribute of an instance')
+        owner = vars(value)
+        if part not in owner:
+            raise LookupError(f'{dotted_name} is inherited or dynamic')
+        value = owner[part]
+        guards.append(Guard(owner, part, value))
+    entry = value
+    if isinstance(value, staticmethod):
+        value = value.__func__
+    if not isinstance(value, FunctionType):
+        raise LookupError(f'{dotted_name} is not a python function')
+    if not unbound and len(parts) > 1 and isinstance(guards[-2].expected, type) and not isinstance(entry, staticmethod):
+        raise LookupError(f'{dotted_name} is called unbound')
+    return value, guards
+
+
+def eligibility_problem(func: FunctionType, func_def: ast.FunctionDef, max_size: int) -> Optional[str]:
+    """Why func cannot be inlined into code that runs in another function, None if it can."""
+    if func.__code__.co_freevars:
+        return 'closure'
+    if hasattr(func, '__wrapped__') or any(ast.unparse(node) != 'staticmethod' for node in func_def.decorator_list):
+        return 'decorated'
+    if (size := body_size(func_def)) > max_size:
+        return f'{size} statements'
+    if blockers := inline_blockers(func_def):
+        return ', '.join(blockers)
+    for node in ast.walk(func_def):
+        if isinstance(node, (ast.Attribute, ast.Subscript)) and not isinstance(node.ctx, ast.Load):
+            return 'stores to an attribute or item'
+        if isinstance(node, ast.Delete):
+            return 'del statement'
+        if isinstance(node, (ast.Lambda, ast.FunctionDef, ast.ClassDef)) and node is not func_def:
+            return 'nested function or class'
+    return None
+
+
+def callee_template(func: FunctionType, max_size: int = MAX_SIZE) -> CalleeTemplate:
+    """The parsed and checked definition of func, analysed once per code object however often it is inlined."""
+    key = (func.__code__, max_size)
+    if key not in _templates:
+        try:
+            func_def = get_source_ast(func)[1].body[0]
+        except OSError as error:
+            _templates[key] = CalleeTemplate(None, set(), str(error))
+        else:
+            _templates[key] = CalleeTemplate(func_def, local_names(func_def),
+                                             eligibility_problem(func, func_def, max_size))
+    return _templates[key]
+
+
+def inline_nested(func_def: ast.FunctionDef, namespace: dict, depth: int = 1, max_size: int = MAX_SIZE,
+                  chain: frozenset = frozenset(), reserved: Set[str] = frozenset(),
+                  unbound: bool = False) -> Tuple[list, list, list]:
+    """
+    Inline the calls in func_def's body, in place, up to `depth` levels deep: calls that come with an inlined body
+    are resolved in the callee's module and inlined in turn. A callee whose code is in `chain` or already inlined
+    on the way down is recursive and stays a call. unbound as in resolve_callee. Returns (inlined, skipped,
+    guards) as in InlinedFunction.
+    """
+    inlined, skipped, guards = [], [], []
+    own_names = local_names(func_def)
+    # in evaluation order: an inlined body lands before the statement of its call, its calls come next
+    todo = deque((call, 1, namespace, chain) for call in _calls(func_def.body, own_names))
+    while todo:
+        call, level, call_namespace, call_chain = todo.popleft()
+        dotted_name = callee_name(call)
+        try:
+            callee, callee_guards = resolve_callee(dotted_name, call_namespace, unbound)
+            if callee.__code__ in call_chain:
+                raise LookupError('recursive')
+            template = callee_template(callee, max_size)
+            if template.problem:
+                raise LookupError(template.problem)
+            callee_guards += _global_guards(callee, template.func_def, namespace)
+            inserted = inline_call(func_def, template.func_def, call, reserved, template.local_names)
+        except (LookupError, TypeError) as error:
+            skipped.append((dotted_name, str(error)))
+            continue
+        inlined.append(dotted_name)
+        guards += [guard for guard in callee_guards if guard not in guards]
+        if level < depth:
+            own_names |= set().union(*map(local_names, inserted))
+            todo.extendleft(reversed([(new_call, level + 1, callee.__globals__, call_chain | {callee.__code__})
+                                      for new_call in _calls(inserted, own_names)]))
+    return inlined, skipped, guards
+
+
+def _calls(body: List[ast.stmt], own_names: Set[str]) -> List[ast.Call]:
+    """Calls by name in the statements of body in evaluation order, those of own_names left out."""
+    calls = []
+    for _, _, stmt, _ in statements(body):
+        stmt_nodes = set(own_nodes(stmt))
+        calls += [node for node in evaluation_order(stmt) if node in stmt_nodes and isinstance(node, ast.Call)
+                  and callee_name(node) and callee_name(node).split('.')[0] not in own_names]
+    return calls
+
+
+def compile_inlined(func: FunctionType, max_size: int = MAX_SIZE, depth: int = 1) -> InlinedFunction:
+    """
+    Recompile func with its calls to small module level functions and static methods inlined, `depth` levels
+    deep, cached per code object. Callees may call anything, mutating methods included, but not store to
+    attributes or items, del or define functions. The guards list every binding the inlined code assumed, see
+    inline_calls.
+    """
+    key = (func.__code__, max_size, depth)
+    if key not in _compiled:
+        _compiled[key] = _compile_inlined(func, max_size, depth)
+    return _compiled[key]
+
+
+def _compile_inlined(func: FunctionType, max_size: int, depth: int) -> InlinedFunction:
+    inlined, skipped, guards = [], [], []
+    try:
+        func_def = get_source_ast(func)[1].body[0]
+    except OSError as error:  # defined in a REPL or by exec
+        return InlinedFunction(None, '', inlined, [(func.__name__, str(error))], guards)
+    if func.__code__.co_freevars or not isinstance(func_def, ast.FunctionDef):
+        return InlinedFunction(None, ast.unparse(func_def), inlined, [(func.__name__, 'closure or coroutine')], guards)
+    func_def.decorator_list = []
+    inlined, skipped, guards = inline_nested(func_def, func.__globals__, depth, max_size, frozenset({func.__code__}))
+    source = ast.unparse(ast.fix_missing_locations(func_def))
+    if not inlined:
+        return InlinedFunction(None, source, inlined, skipped, guards)
+    module = ast.Module(body=[func_def], type_ignores=[])
+    code = compile(ast.fix_missing_locations(module), func.__code__.co_filename, 'exec')
+    func_code = next(const for const in code.co_consts if isinstance(const, CodeType))
+    return InlinedFunction(func_code, source, inlined, skipped, guards)
+
+
+def _global_guards(callee: FunctionType, callee_def: ast.FunctionDef, namespace: dict) -> List[Guard]:
+    """The globals callee reads now resolve in namespace, they have to be the same objects in both modules."""
+    if callee.__globals__ is namespace:
+        return []
+    guards = []
+    free = {node.id for node in ast.walk(callee_def) if isinstance(node, ast.Name)} - local_names(callee_def)
+    for name in sorted(free):
+        if name in callee.__globals__:
+            if namespace.get(name) is not callee.__globals__[name]:
+                raise LookupError(f'{name} means something else in {callee.__module__}')
+            guards += [Guard(callee.__globals__, name, namespace[name]), Guard(namespace, name, namespace[name])]
+        elif not hasattr(builtins, name) or name in namespace:
+            raise LookupError(f'{name} is not defined in {callee.__module__}')
+    return guards
+
+
+def inline_calls(func: Callable = None, *, max_size: int = MAX_SIZE, depth: int = 1):
+    """
+    Decorator: on the first call, func is recompiled with its calls to small functions inlined (see
+    compile_inlined). Every later call checks that the inlined callees are still bound to the same objects and
+    runs the original function when one was rebound, e.g. by a monkeypatch. With depth > 1 the calls in the
+    inlined bodies are inlined too.
+
+    @inline_calls
+    def norm(xs):
+        return sum_sq(xs) ** .5
+    """
+    if func is None:
+        return functools.partial(inline_calls, max_size=max_size, depth=depth)
+
+    fast, guards = None, ()
+
+    @functools.wraps(func)
+    def guarded(*args, **kwargs):
+        nonlocal fast, guards
+        if fast is None:
+            fast, guards = _fast_function(func, max_size, depth)
+        for namespace, name, expected in guards:
+            if namespace.get(name) is not expected:
+                return func(*args, **kwargs)
+        return fast(*args, **kwargs)
+
+    return guarded
+
+
+def _fast_function(func: FunctionType, max_size: int, depth: int) -> Tuple[Callable, tuple]:
+    inlined = compile_inlined(inspect.unwrap(func), max_size, depth)
+    if inlined.code is None:
+        return func, ()
+    fast = FunctionType(inlined.code, func.__globals__, func.__name__, func.__defaults__)
+    fast.__kwdefaults__ = func.__kwdefaults__
+    fast.__qualname__ = func.__qualname__
+    return fast, tuple(inlined.guards)
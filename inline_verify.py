@@ -0,0 +1,270 @@
+import ast
+import contextlib
+import copy
+import io
+import linecache
+import reprlib
+import sys
+import tempfile
+import textwrap
+import timeit
+from itertools import count
+from types import FunctionType, ModuleType
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
+
+from icecream import ic
+
+from ast_inline import inline_src
+
+MAX_SNAPSHOT_DEPTH = 20
+_sources = count()
+
+
+class VerifyResult(NamedTuple):
+    expr: str  # the call, as written at the call site
+    block: str  # the inlined code block
+    ret_var: Optional[str]
+    equal: bool  # same return value (or the same exception type)
+    state_diff: List[str]  # names of the call site whose value differs after running the block
+    original_s: Optional[float] = None  # best time per run of the call / the block
+    inlined_s: Optional[float] = None
+    error: Optional[str] = None  # inlining failed, or how the call and the block ended when they disagree
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.equal and not self.state_diff
+
+    @property
+    def speedup(self) -> Optional[float]:
+        return self.original_s / self.inlined_s if self.original_s and self.inlined_s else None
+
+
+class Case(NamedTuple):
+    name: str
+    expr: str
+    namespace: Union[dict, Callable[[], dict]]  # see verify
+    depth: int = 1
+    optimize: bool = False
+
+
+def snapshot(obj, depth: int = 0):
+    """Comparable picture of obj's state: containers and instance attributes unpacked, callables by name."""
+    if depth > MAX_SNAPSHOT_DEPTH:
+        return '...'
+    if isinstance(obj, (ModuleType, FunctionType, type)) or callable(obj) and not hasattr(obj, '__dict__'):
+        # by name: fresh namespaces define their own copies of the same functions
+        return 'callable', getattr(obj, '__module__', None), getattr(obj, '__qualname__', obj.__class__.__name__)
+    if isinstance(obj, (list, tuple)):
+        return type(obj).__name__, [snapshot(item, depth + 1) for item in obj]
+    if isinstance(obj, dict):
+        return 'dict', [(snapshot(key, depth + 1), snapshot(value, depth + 1)) for key, value in obj.items()]
+    if isinstance(obj, (set, frozenset)):
+        return type(obj).__name__, sorted(map(repr, obj))
+    if hasattr(obj, '__dict__') and type(obj).__eq__ is object.__eq__:
+        return type(obj).__qualname__, snapshot(vars(obj), depth + 1)
+    return obj
+
+
+def copy_namespace(namespace: dict) -> dict:
+    """Deep copy of the call site state, modules, functions and classes shared."""
+    memo = {}
+    new_namespace = {}
+    for name, value in namespace.items():
+        if isinstance(value, (ModuleType, FunctionType, type)):
+            new_namespace[name] = value
+            continue
+        try:
+            new_namespace[name] = copy.deepcopy(value, memo)
+        except Exception:  # locks, generators, ... are shared
+            new_namespace[name] = value
+    return new_namespace
+
+
+def compile_source(src: str, mode: str = 'exec'):
+    """Compiled with a file name linecache knows, so inline_src can read the call site back."""
+    file = f'<inline_verify {next(_sources)}>'
+    linecache.cache[file] = (len(src), None, src.splitlines(True), file)
+    return compile(src, file, mode)
+
+
+def inline_block(expr: str, namespace: dict, depth: int = 1, optimize: bool = False) -> tuple:
+    """(block source, return variable) inline_src generates for `expr` run in namespace, its output silenced."""
+    namespace['inline_src'] = inline_src
+    code = compile_source(f'_verify_out = inline_src({expr}, debug=True, depth={depth}, optimize={optimize})\n')
+    enabled = ic.enabled
+    ic.disable()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            exec(code, namespace)
+    finally:
+        ic.enabled = enabled
+    func_def = namespace['_verify_out'][2].body[0]
+    ret_vars = [node.targets[0].id for node in func_def.body if isinstance(node, ast.Assign)
+                and isinstance(node.targets[0], ast.Name) and node.targets[0].id.endswith('_ret')
+                and not node.targets[0].id.startswith('_')]
+    return ast.unparse(func_def.body), ret_vars[-1] if ret_vars else None
+
+
+def _run(code, namespace: dict, mode: str):
+    try:
+        return (eval if mode == 'eval' else exec)(code, namespace), None
+    except Exception as error:
+        return None, error
+
+
+def _outcome(value, error: Optional[Exception]) -> str:
+    return f'{type(error).__name__}: {error}' if error else f'returned {reprlib.repr(value)}'
+
+
+def _same(a, b) -> bool:
+    try:
+        return bool(snapshot(a) == snapshot(b))
+    except Exception:  # e.g. arrays without a truth value
+        return repr(a) == repr(b)
+
+
+def verify(expr: str, namespace: Union[dict, Callable[[], dict]], depth: int = 1, optimize: bool = False,
+           number: int = None, repeat: int = 5) -> VerifyResult:
+    """
+    Inline `expr` with inline_src, then run the original call and the block each on a fresh namespace: the return
+    values (or exception types) must match, and so must every name of the namespace afterwards. namespace is
+    copied for each run, or called for a new one when the callee mutates its module's globals (a call site at
+    module level). With number set both are also timed with timeit, best of `repeat`.
+    """
+    fresh = namespace if callable(namespace) else lambda: copy_namespace(namespace)
+    try:
+        block, ret_var = inline_block(expr, fresh(), depth, optimize)
+    except Exception as error:
+        return VerifyResult(expr, '', None, False, [], error=f'{type(error).__name__}: {error}')
+    call_code, block_code = compile_source(expr, 'eval'), compile_source(block)
+    original_ns, inlined_ns = fresh(), fresh()
+    names = list(original_ns)
+    original, original_error = _run(call_code, original_ns, 'eval')
+    _, inlined_error = _run(block_code, inlined_ns, 'exec')
+    inlined = inlined_ns.get(ret_var) if ret_var else None
+    equal = type(original_error) is type(inlined_error) and (original_error is not None or _same(original, inlined))
+    state_diff = [name for name in names if not _same(original_ns.get(name), inlined_ns.get(name))]
+    error = None if equal else \
+        f'call: {_outcome(original, original_error)}, block: {_outcome(inlined, inlined_error)}'
+    result = VerifyResult(expr, block, ret_var, equal, state_diff, error=error)
+    if number is None or original_error or inlined_error:
+        return result
+    # timed as the body of a function, where inlined code usually lands: its temporaries are fast locals. On
+    # fresh namespaces, the equivalence run may have grown the state the call works on
+    call_site = timing_function(f'return {expr}', fresh())
+    inlined_site = timing_function(f'{block}\nreturn {ret_var}', fresh())
+    original_s = min(timeit.repeat(call_site, number=number, repeat=repeat)) / number
+    inlined_s = min(timeit.repeat(inlined_site, number=number, repeat=repeat)) / number
+    return result._replace(original_s=original_s, inlined_s=inlined_s)
+
+
+def timing_function(body: str, namespace: dict) -> Callable[[], Any]:
+    """A function running body with namespace as its globals."""
+    src = 'def _verify_site():\n' + textwrap.indent(body, '    ') + '\n'
+    exec(compile_source(src), namespace)
+    return namespace.pop('_verify_site')
+
+
+def run_cases(cases: List[Case], number: int = None, repeat: int = 5) -> Dict[str, VerifyResult]:
+    return {case.name: verify(case.expr, case.namespace, case.depth, case.optimize, number, repeat)
+            for case in cases}
+
+
+def _status(result: VerifyResult) -> str:
+    if result.ok:
+        return 'ok'
+    if not result.block:
+        return 'ERROR'  # could not inline
+    return 'DIFFERS' if not result.equal else 'STATE'
+
+
+def report(results: Dict[str, VerifyResult]) -> str:
+    failed = sum(not result.ok for result in results.values())
+    lines = [f'# inline verification: {len(results) - failed} ok, {failed} failed',
+             f'# {"case":<28} {"result":<10} {"call us":>9} {"block us":>9} {"speedup":>8}']
+    for name, result in results.items():
+        status = _status(result)
+        timing = f'{result.original_s * 1e6:9.3f} {result.inlined_s * 1e6:9.3f} {result.speedup:7.2f}x' \
+            if result.speedup else ''
+        lines.append(f'  {name:<28} {status:<10} {timing}'.rstrip())
+        if result.error:
+            lines.append(f'    {result.error}')
+        elif result.state_diff:
+            lines.append(f'    changed differently: {", ".join(result.state_diff)}')
+    return '\n'.join(lines)
+
+
+def fixture_cases() -> List[Case]:
+    """Call sites over the mockeries fixtures."""
+    from mockeries import hot_loop
+    from mockeries.mock_module import A, B, C, abc, add_func
+
+    def namespace():
+        return {'add_func': add_func, 'abc': abc, 'A': A, 'obj_a': A(), 'obj_b': B(), 'obj_c': C(), 'x': 1,
+                'z': 'rr', 'hot_loop': hot_loop, 'scale': hot_loop.scale, 'total': hot_loop.total}
+
+    return [Case('add_func', 'add_func(1, 1)', namespace),
+            Case('add_func args', "add_func([1], x, 1, 2, 3, k={3: 4}, z=z)", namespace),
+            Case('add_func optimized', 'add_func(1, 1)', namespace, optimize=True),
+            Case('add_func depth 2', 'add_func(1, 1)', namespace, depth=2, optimize=True),
+            Case('abc', 'abc(1, k=2)', namespace),
+            Case('method', 'obj_a.p(2)', namespace),
+            Case('nested method', 'obj_b.a.p(1)', namespace),
+            Case('static method', 'A.s(1, 2)', namespace),
+            Case('super call', 'obj_c.q(5)', namespace),
+            Case('super call depth 2', 'obj_c.q(5)', namespace, depth=2),
+            Case('unbound call', 'obj_c.q1(5)', namespace),
+            Case('scale', 'scale(3)', namespace, optimize=True),
+            Case('loop', 'total(range(50))', namespace, depth=2)]
+
+
+STRESS_TEMPLATE = '''
+def helper_{i}(value, factor={i}):
+    return value * factor + {i}
+
+
+def stress_{i}(a, b, *rest, scale=2, **options):
+    total = a + b
+    for item in rest:
+        total += helper_{i}(item)
+    unused = [a, b]
+    if scale > {i}:
+        total = total * scale
+    else:
+        total = total - scale
+    state.append(total)
+    return total + len(options)
+'''
+
+
+def stress_cases(n: int = 10) -> List[Case]:
+    """
+    n generated functions with varargs, defaults, loops, branches, helpers and a mutated global. Every run gets a
+    fresh copy of the module and calls from its top level, so the call and the block append to the same `state`.
+    """
+    src = 'state = []\n' + ''.join(STRESS_TEMPLATE.format(i=i) for i in range(n))
+    # inspect reads the source back, a file of its own per call so concurrent runs do not overwrite each other's
+    with tempfile.NamedTemporaryFile('w', prefix='inline_verify_stress_', suffix='.py', delete=False) as stress_file:
+        stress_file.write(src)
+    code = compile(src, stress_file.name, 'exec')
+
+    def namespace():
+        module_namespace = {'__name__': 'inline_stress', 'extra': [1, 2, 3]}
+        exec(code, module_namespace)
+        return module_namespace
+
+    return [Case(f'stress {i}', f'stress_{i}({i}, 2, *extra, scale={i % 4}, flag=True)', namespace,
+                 depth=1 + i % 2, optimize=i % 3 == 0) for i in range(n)]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='check inlined blocks against the original calls and time both')
+    parser.add_argument('--number', type=int, default=10000, help='runs per timing')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--stress', type=int, default=10, help='generated stress cases')
+    args = parser.parse_args()
+    results = run_cases(fixture_cases() + stress_cases(args.stress), args.number, args.repeat)
+    print(report(results))
+    sys.exit(0 if all(result.ok for result in results.values()) else 1)
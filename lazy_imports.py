@@ -0,0 +1,350 @@
+import ast
+import difflib
+import os
+import symtable
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from ast_inline import VariableCollector, bound_name, local_names
+from dep_crawl import Import, extract_imports, get_src_files, get_static_src_file, parse_imports
+
+COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef) + COMPREHENSIONS
+
+
+class LazyRewrite(NamedTuple):
+    file: str
+    source: str
+    new_source: str
+    deferred: Dict[str, List[str]]  # deferred import statement -> functions it moved into
+    problems: List[str]  # reasons the rewrite may change module level behaviour, empty if it checked out
+    saving_us: Optional[int] = None  # estimated import time the module stops paying at load
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+    def diff(self) -> str:
+        return ''.join(difflib.unified_diff(self.source.splitlines(keepends=True),
+                                            self.new_source.splitlines(keepends=True),
+                                            self.file, f'{self.file} (lazy imports)'))
+
+
+def _scope_parts(scope: ast.AST) -> Tuple[List[ast.AST], List[ast.AST]]:
+    """(nodes run in the scope's own namespace, nodes of the scope run in the enclosing one when it is created)"""
+    if isinstance(scope, COMPREHENSIONS):
+        inner = [scope.key, scope.value] if isinstance(scope, ast.DictComp) else [scope.elt]
+        for i, generator in enumerate(scope.generators):
+            inner += [generator.target] + generator.ifs + ([generator.iter] if i else [])
+        return inner, [scope.generators[0].iter]
+    if isinstance(scope, ast.ClassDef):
+        return scope.body, scope.decorator_list + scope.bases + [keyword.value for keyword in scope.keywords]
+    args = scope.args
+    outer = args.defaults + [default for default in args.kw_defaults if default]
+    if isinstance(scope, ast.Lambda):
+        return [scope.body], outer
+    params = args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]
+    outer += [arg.annotation for arg in params if arg is not None and arg.annotation]
+    return scope.body, scope.decorator_list + outer + ([scope.returns] if scope.returns else [])
+
+
+def _split_scope(nodes: Iterable[ast.AST]) -> Tuple[List[ast.AST], List[ast.AST]]:
+    """(the nodes of nodes' own scope, the scopes nested directly in it)"""
+    own, nested, todo = [], [], list(nodes)
+    while todo:
+        node = todo.pop()
+        if isinstance(node, SCOPES):
+            nested.append(node)
+            todo.extend(_scope_parts(node)[1])
+        else:
+            own.append(node)
+            todo.extend(ast.iter_child_nodes(node))
+    return own, nested
+
+
+def scope_names(scope: ast.AST) -> Set[str]:
+    """Names scope binds in its own namespace: nested scopes only bind their def / class name (and walruses)."""
+    own, nested = _split_scope(_scope_parts(scope)[0])
+    names = set()
+    if not isinstance(scope, (ast.ClassDef,) + COMPREHENSIONS):
+        args = scope.args
+        names.update(arg.arg for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]
+                     if arg is not None)
+    for node in own:
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update(bound_name(alias) for alias in node.names)
+        elif isinstance(node, (ast.ExceptHandler, ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+    while nested:
+        node = nested.pop()
+        if isinstance(node, COMPREHENSIONS):  # an assignment expression binds in the enclosing function
+            comprehension_own, comprehension_nested = _split_scope(_scope_parts(node)[0])
+            names.update(child.target.id for child in comprehension_own if isinstance(child, ast.NamedExpr))
+            nested.extend(child for child in comprehension_nested if isinstance(child, COMPREHENSIONS))
+        elif not isinstance(node, ast.Lambda):
+            names.add(node.name)
+    return names - {name for node in own if isinstance(node, (ast.Global, ast.Nonlocal)) for name in node.names}
+
+
+def global_reads(scope: ast.AST) -> Set[str]:
+    """Names the code of scope, nested scopes included, reads from the module globals."""
+    own, nested = _split_scope(_scope_parts(scope)[0])
+    reads = {node.id for node in own if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Store)}
+    reads.update(node.target.id for node in own
+                 if isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name))
+    nested_reads = set().union(*map(global_reads, nested))
+    if isinstance(scope, ast.ClassDef):  # class attributes are not visible in the methods
+        return reads - scope_names(scope) | nested_reads
+    return (reads | nested_reads) - scope_names(scope)
+
+
+def used_names(nodes: Iterable[ast.AST]) -> Set[str]:
+    collector = VariableCollector()
+    for node in nodes:
+        collector.visit(node)
+    return collector.used
+
+
+class _ScopeSplitter:
+    """Splits a module into code run at import time and the function bodies that only run when called."""
+
+    def __init__(self, tree: ast.Module, lazy_annotations: bool):
+        self.lazy_annotations = lazy_annotations
+        self.eager: List[ast.AST] = []
+        self.functions: List[ast.AST] = []  # outermost functions and methods
+        self.bound: List[str] = []  # names bound by module level statements
+        for stmt in tree.body:
+            if not isinstance(stmt, (ast.Import, ast.ImportFrom)):
+                self.visit_stmt(stmt, module_level=True)
+
+    def visit_stmt(self, stmt: ast.stmt, module_level: bool):
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            self.functions.append(stmt)
+            self.eager.extend(stmt.decorator_list)
+            self.eager.extend(default for default in stmt.args.defaults + stmt.args.kw_defaults if default)
+            if not self.lazy_annotations:
+                args = stmt.args.posonlyargs + stmt.args.args + stmt.args.kwonlyargs + [stmt.args.vararg,
+                                                                                        stmt.args.kwarg]
+                self.eager.extend(arg.annotation for arg in args if arg is not None and arg.annotation)
+                if stmt.returns:
+                    self.eager.append(stmt.returns)
+            if module_level:
+                self.bound.append(stmt.name)
+        elif isinstance(stmt, ast.ClassDef):
+            self.eager.extend(stmt.decorator_list + stmt.bases + [keyword.value for keyword in stmt.keywords])
+            for child in stmt.body:
+                self.visit_stmt(child, module_level=False)
+            if module_level:
+                self.bound.append(stmt.name)
+        else:
+            self.eager.append(stmt)
+            if module_level:
+                self.bound.extend(name for name in local_names(stmt) if not name.startswith('global '))
+
+
+def _insert_line(func: ast.AST) -> Optional[int]:
+    """0-based line the function's imports go before (after a docstring), None for one-line functions."""
+    first = func.body[0]
+    if first.lineno == func.lineno:
+        return None
+    if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) and isinstance(first.value.value, str):
+        return first.end_lineno
+    return min([first.lineno] + [decorator.lineno for decorator in getattr(first, 'decorator_list', [])]) - 1
+
+
+def rewrite_source(source: str, file: str = '<module>', exported: Iterable[str] = ()) -> LazyRewrite:
+    """
+    Move module level imports into the functions that use them when no import-time code reads them.
+    Imports that are module attributes other modules import (`exported`, `__all__`), rebound at module level,
+    declared global in a function or shadowed by a function's own binding are left in place.
+    """
+    tree = ast.parse(source, filename=file)
+    lazy_annotations = any(isinstance(stmt, ast.ImportFrom) and stmt.module == '__future__'
+                           and any(alias.name == 'annotations' for alias in stmt.names) for stmt in tree.body)
+    scopes = _ScopeSplitter(tree, lazy_annotations)
+    eager_used = used_names(scopes.eager)
+    func_reads = [global_reads(func) for func in scopes.functions]
+    declared_global = {name for func in scopes.functions for node in ast.walk(func) if isinstance(node, ast.Global)
+                       for name in node.names}
+    keep = set(exported) | eager_used | set(scopes.bound)
+    for stmt in tree.body:
+        if isinstance(stmt, ast.Assign) and any(isinstance(target, ast.Name) and target.id == '__all__'
+                                                for target in stmt.targets):
+            keep.update(elt.value for elt in getattr(stmt.value, 'elts', []) if isinstance(elt, ast.Constant))
+
+    imports = [stmt for stmt in tree.body if isinstance(stmt, (ast.Import, ast.ImportFrom))]
+    name_counts: Dict[str, int] = {}
+    for stmt in imports:
+        for alias in stmt.names:
+            name_counts[bound_name(alias)] = name_counts.get(bound_name(alias), 0) + 1
+    stmt_lines = {}
+    for stmt in tree.body:
+        for line in range(stmt.lineno, stmt.end_lineno + 1):
+            stmt_lines[line] = stmt_lines.get(line, 0) + 1
+
+    lines = source.splitlines(keepends=True)
+    replacements: Dict[int, tuple] = {}  # first line -> (last line, replacement text)
+    insertions: Dict[int, List[str]] = {}  # line -> import lines inserted before it
+    deferred: Dict[str, List[str]] = {}
+    for stmt in imports:
+        if isinstance(stmt, ast.ImportFrom) and (stmt.module == '__future__'
+                                                 or any(alias.name == '*' for alias in stmt.names)):
+            continue
+        if any(stmt_lines[line] > 1 for line in range(stmt.lineno, stmt.end_lineno + 1)):
+            continue  # shares its lines with another statement
+        moved, users = [], {}
+        for alias in stmt.names:
+            name = bound_name(alias)
+            if name in keep or name_counts[name] > 1 or name in declared_global:
+                continue
+            using = [func for func, reads in zip(scopes.functions, func_reads) if name in reads]
+            if not using or any(_insert_line(func) is None for func in using):
+                continue
+            moved.append(alias)
+            users[alias.name, alias.asname] = using
+        if not moved:
+            continue
+        remaining = [alias for alias in stmt.names if alias not in moved]
+        replacement = ''
+        if remaining:
+            node = ast.Import(names=remaining) if isinstance(stmt, ast.Import) else \
+                ast.ImportFrom(module=stmt.module, names=remaining, level=stmt.level)
+            replacement = ast.unparse(node) + '\n'
+        replacements[stmt.lineno - 1] = (stmt.end_lineno - 1, replacement)
+        for alias in moved:
+            node = ast.Import(names=[alias]) if isinstance(stmt, ast.Import) else \
+                ast.ImportFrom(module=stmt.module, names=[alias], level=stmt.level)
+            text = ast.unparse(node)
+            for func in users[alias.name, alias.asname]:
+                line = _insert_line(func)
+                indent = lines[func.body[0].lineno - 1][:func.body[0].col_offset]
+                insertions.setdefault(line, []).append(f'{indent}{text}\n')
+                deferred.setdefault(text, []).append(func.name)
+
+    new_lines = []
+    skip_until = -1
+    for i, line in enumerate(lines):
+        new_lines.extend(insertions.get(i, []))
+        if i <= skip_until:
+            continue
+        if i in replacements:
+            skip_until, replacement = replacements[i]
+            if replacement:
+                new_lines.append(replacement)
+            elif (not new_lines or not new_lines[-1].strip()) and skip_until + 1 < len(lines) \
+                    and not lines[skip_until + 1].strip():
+                skip_until += 1  # don't leave the blank line of an import group behind
+            continue
+        new_lines.append(line)
+    new_source = ''.join(new_lines)
+    moved_names = {bound_name(ast.parse(text).body[0].names[0]) for text in deferred}
+    return LazyRewrite(file, source, new_source, deferred, check_rewrite(source, new_source, moved_names))
+
+
+def check_rewrite(source: str, new_source: str, moved: Set[str]) -> List[str]:
+    """Compare what the old and new module bind and read at import time, only `moved` may differ."""
+    try:
+        compile(new_source, '<lazy imports>', 'exec')
+    except SyntaxError as error:
+        return [f'rewritten source does not compile: {error}']
+    old_tree, new_tree = ast.parse(source), ast.parse(new_source)
+    problems = []
+    old_scopes, new_scopes = _ScopeSplitter(old_tree, False), _ScopeSplitter(new_tree, False)
+    if used_names(old_scopes.eager) != used_names(new_scopes.eager):
+        problems.append('import-time code reads different names')
+    old_bound = set(old_scopes.bound) | {bound_name(alias) for stmt in old_tree.body
+                                         if isinstance(stmt, (ast.Import, ast.ImportFrom)) for alias in stmt.names}
+    new_bound = set(new_scopes.bound) | {bound_name(alias) for stmt in new_tree.body
+                                         if isinstance(stmt, (ast.Import, ast.ImportFrom)) for alias in stmt.names}
+    if old_bound - new_bound != moved or new_bound - old_bound:
+        problems.append(f'module level names changed: {sorted(old_bound ^ new_bound)}')
+    # the compiler's own scope analysis, every function (nested ones too) on its own
+    tables = [(table, False) for table in symtable.symtable(new_source, '<lazy imports>', 'exec').get_children()]
+    while tables:
+        table, in_function = tables.pop(0)
+        in_function = in_function or table.get_type() == 'function'
+        tables.extend((child, in_function) for child in table.get_children())
+        unresolved = sorted(symbol.get_name() for symbol in table.get_symbols()
+                            if symbol.is_global() and symbol.is_referenced() and symbol.get_name() in moved)
+        if in_function and unresolved:
+            problems.append(f'{table.get_name()} reads {unresolved} without importing it')
+    return problems
+
+
+def exported_names(files: Iterable[str]) -> Dict[str, Set[str]]:
+    """file -> names other files in `files` import from it with `from module import name`."""
+    exported: Dict[str, Set[str]] = {}
+    for file in files:
+        for imp in extract_imports(file):
+            if imp.module is None and not imp.level:
+                continue
+            parent = Import(stmt=f"import {imp.module}", obj=imp.module) if not imp.level else \
+                Import(stmt=f"from {'.' * imp.level}{imp.module or ''} import *", module=imp.module, obj='*',
+                       level=imp.level)
+            if (src_file := get_static_src_file(parent, file)) is not None:
+                exported.setdefault(src_file, set()).add(imp.obj)
+    return exported
+
+
+def estimate_saving(rewrite: LazyRewrite, profile, module: Optional[str]) -> int:
+    """
+    Import time of the deferred modules that `module` (None for the profiled entry file) loaded first,
+    taken from an import_profile.ImportProfile. Modules loaded earlier by someone else save nothing.
+    """
+    saving = 0
+    for text in rewrite.deferred:
+        imp = parse_imports(text)[0]
+        target = get_static_src_file(imp, rewrite.file)
+        cost = profile.costs.get(profile.modules_by_file.get(target))
+        if cost is not None and cost.parent == module:
+            saving += cost.cumulative_us
+    return saving
+
+
+def rewrite_closure(file: str, bound_path: str = '.', estimate=True, write=False) -> List[LazyRewrite]:
+    """
+    Rewrite the entry file and every first party module it imports. With estimate=True the entry is profiled
+    once (import_profile) and each rewrite reports the import time it would stop paying at load.
+    With write=True rewrites that pass check_rewrite are written back.
+    """
+    files = [os.path.abspath(file)] + get_src_files(file, bound_path, is_abs=False, static=True)
+    files = list(dict.fromkeys(os.path.abspath(path) for path in files))
+    exported = exported_names(files)
+    profile = None
+    if estimate:
+        from import_profile import profile_imports
+
+        profile = profile_imports(file, bound_path)
+    rewrites = []
+    for path in files:
+        with open(path, 'r') as src_file:
+            rewrite = rewrite_source(src_file.read(), path, exported.get(path, ()))
+        if not rewrite.deferred:
+            continue
+        if profile is not None:
+            module = None if path == files[0] else profile.modules_by_file.get(path)
+            rewrite = rewrite._replace(saving_us=estimate_saving(rewrite, profile, module))
+        if write and rewrite.ok:
+            with open(path, 'w') as src_file:
+                src_file.write(rewrite.new_source)
+        rewrites.append(rewrite)
+    return rewrites
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='defer imports only used inside functions')
+    parser.add_argument('file')
+    parser.add_argument('--bound-path', default='.')
+    parser.add_argument('--write', action='store_true')
+    parser.add_argument('--no-estimate', action='store_true')
+    args = parser.parse_args()
+    for rewrite in rewrite_closure(args.file, args.bound_path, not args.no_estimate, args.write):
+        print(rewrite.diff())
+        status = 'ok' if rewrite.ok else f'NOT applied: {"; ".join(rewrite.problems)}'
+        saving = f', ~{rewrite.saving_us / 1000:.2f} ms saved at startup' if rewrite.saving_us is not None else ''
+        print(f'# {rewrite.file}: {status}{saving}')
@@ -0,0 +1,37 @@
+def scale(value, factor=2):
+    scaled = value * factor
+    return scaled + 1
+
+
+def clamp(value, low=0, high=100):
+    if value < low:
+        return low
+    return min(value, high)
+
+
+def total(values):
+    acc = 0
+    for value in values:
+        acc += scale(value)
+    return acc
+
+
+def clamped(values):
+    out = []
+    for value in values:
+        out.append(clamp(value))
+    return out
+
+
+def workload():
+    return total(range(20000)), sum(clamped(range(-50, 5000)))
+
+
+def square(value):
+    return value * value
+
+
+class Vec:
+    @staticmethod
+    def dot(x1, y1, x2, y2):
+        return x1 * x2 + y1 * y2
@@ -1,5 +1,24 @@
-from ast_inline import inline_src
-from dep_crawl import get_src_files
-
 # mytools.inline_src(some_func(*args, **kwargs))
 # mytools.get_src_files(file_path)
+
+# imported from the IDE startup hook, so nothing heavy (ipdb, icecream, pydantic) loads until a tool is first used
+_LAZY = {
+    'inline_src': 'ast_inline',
+    'get_src_files': 'dep_crawl',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    import importlib
+
+    value = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,55 @@
+import ast
+import contextlib
+import io
+
+from ast_inline import inline_src
+from ast_optimize import optimize
+from mockeries.mock_module import add_func
+
+
+def run(src: str) -> dict:
+    log = []
+    namespace = {'log': log.append, 'items': [3, 1, 2]}
+    exec(src, namespace)
+    return {'ret': namespace.get('ret'), 'log': log}
+
+
+def check(src: str, expected: str = None):
+    """The optimized block computes the same `ret` with the same side effects, and is never bigger."""
+    optimized = ast.unparse(optimize(ast.parse(src).body, keep={'ret'}))
+    assert run(optimized) == run(src), (src, optimized)
+    assert len(list(ast.walk(ast.parse(optimized)))) <= len(list(ast.walk(ast.parse(src))))
+    if expected is not None:
+        assert optimized == expected, optimized
+    return optimized
+
+
+check('x = 1\ny = x + 2\nret = y * 3', 'ret = 9')
+check('a, b = (1, 2)\nunused = [1, 2]\nret = 5', 'ret = 5')
+check('debug = False\nif debug:\n    log(1)\nelse:\n    log(2)\nret = 1 if debug else 0', 'log(2)\nret = 0')
+check('n = 0\nwhile False:\n    n += 1\nret = n', 'ret = 0')
+check('k = 2\nret = k > 1 and k < 3 or log(k)', 'ret = True')
+check('def helper(v):\n    return v\nret = 4', 'ret = 4')
+# loops rebind: no substitution into the loop, the first assignment stays
+check('x = 0\nfor i in items:\n    x += i\nret = x', 'x = 0\nfor i in items:\n    x += i\nret = x')
+check('x = 1\nwhile x < 4:\n    x = x * 2\nret = x')
+# the value is read before the target is bound, assignment expressions bind while it is read
+check('x = 1\nx = x + 1\nret = x', 'ret = 2')
+check('x = 1\nret = (x := 5) + x', 'x = 1\nret = (x := 5) + x')
+# closures see the last binding, not the one at definition time
+check('x = 1\ndef get():\n    return x\nx = 2\nret = get()')
+check('x = 1\ndel x\nret = 0')
+check('x = 0\nx += 1\nret = x')
+# side effects and failures stay
+check('log(1)\nret = None', 'log(1)\nret = None')
+annotated = 'def f(x: log(1), *args: int) -> log(2):\n    pass\nret = 0'
+check(annotated, annotated)
+check('def f(x: int) -> int:\n    pass\nret = 0', 'ret = 0')
+check('x = 0\ntry:\n    y = 1 / x\nexcept ZeroDivisionError:\n    y = -1\nret = y')
+assert '**' in check('ret = 10 ** 1000')
+
+stdout = io.StringIO()
+with contextlib.redirect_stdout(stdout):
+    inline_src(add_func(1, 1), optimize=True)
+block = stdout.getvalue().split('# ------------------ inlined code block:\n')[1].split('# ---')[0]
+assert block == 'kwargs = {}\nimport math\nmath.log(3)\nabc(**kwargs)\nadd_func_ret = 2\n', block
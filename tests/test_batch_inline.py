@@ -0,0 +1,46 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from batch_inline import InlineCache, inline_calls_in_file, inline_files, inline_package
+
+# every first party call in the file, definitions found through imports without running anything
+results, depends = inline_calls_in_file('mockeries/mock_ref.py')
+assert [(result.func, result.code) for result in results] == [('dummy_func', 'dummy_func_ret = sqrt(A)'),
+                                                             ('abc', 'args = ()\nkwargs = {}\nabc_ret = 1')]
+assert os.path.abspath('mockeries/sub_mod/dummy.py') in depends
+
+# the block inline_src prints for the live call in tests/test_inline.py, less its renames apart from the call site
+results, _ = inline_calls_in_file('tests/test_inline.py', targets=['add_func'], lines=[15])
+assert results[0].code.splitlines() == ['x_ = [1]', 'y = x', 'args = (1, 2, 3)', "kwargs = {'z': z}", 'k = {3: 4}',
+                                        'import math', 'math.log(3)', 'x_ = 1', 'a, b = (1, 2)', '',
+                                        'def cde(x_):', '    return x_', 'abc(**kwargs)', 'add_func_ret = x_ + y']
+results, _ = inline_calls_in_file('tests/test_inline.py', targets=['add_func', 'A.from_int'])
+problems = {result.call: result.problem for result in results if not result.ok}
+assert problems['add_func(1, *some_args)'] == '*some_args cannot be bound without running the code'
+assert 'only static methods' in problems['A.from_int(5)']
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    package = os.path.join(tmp_dir, 'mockeries')
+    shutil.copytree('mockeries', package)
+    sys.path.insert(0, tmp_dir)  # absolute imports in the copy resolve to the copy
+    cache = InlineCache(os.path.join(tmp_dir, 'cache.json'))
+    serial = inline_package(package, bound_path=tmp_dir)
+    assert [result.code for result in serial[os.path.join(package, 'mock_ref.py')]][0] == 'dummy_func_ret = sqrt(A)'
+    parallel = inline_package(package, bound_path=tmp_dir, cache=cache, workers=2)
+    assert serial == parallel and cache.misses == len(serial)
+
+    cache = InlineCache(os.path.join(tmp_dir, 'cache.json'))
+    assert inline_package(package, bound_path=tmp_dir, cache=cache) == serial
+    assert cache.hits == len(serial) and cache.misses == 0
+
+    # editing a definition invalidates the files whose results used it
+    time.sleep(0.01)
+    with open(os.path.join(package, 'sub_mod', 'dummy.py'), 'a') as file:
+        file.write('\n\ndef dummy_func():\n    return A + 1\n')
+    mock_ref = os.path.join(package, 'mock_ref.py')
+    updated = inline_files([mock_ref], bound_path=tmp_dir, cache=cache)
+    assert cache.misses == 1 and updated[mock_ref][0].code == 'dummy_func_ret = A + 1'
+    sys.path.remove(tmp_dir)
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+from bundle import MANIFEST_NAME, bundle
+
+file_path = 'mockeries/mock_ref.py'
+with tempfile.TemporaryDirectory() as out_dir:
+    output = os.path.join(out_dir, 'mock_ref.pyz')
+    result = bundle(file_path, output)
+    assert result.rebuilt
+    assert sorted(result.manifest['files']) == ['mockeries/__init__.py', 'mockeries/mock_module.py',
+                                                'mockeries/mock_ref.py', 'mockeries/sub_mod/dummy.py',
+                                                'mockeries/sub_mod/yummy.py']
+    with zipfile.ZipFile(output) as archive:
+        names = archive.namelist()
+    assert '__main__.pyc' in names and MANIFEST_NAME in names and not any(name.endswith('.py') for name in names)
+
+    # nothing changed, nothing rebuilt
+    assert not bundle(file_path, output).rebuilt
+
+    # a checkout with other mtimes builds the same bytes
+    with open(output, 'rb') as file:
+        first_build = file.read()
+    stamps = {path: os.stat(path) for path in result.manifest['files']}
+    try:
+        for path in stamps:
+            os.utime(path)
+        assert bundle(file_path, output, force=True).rebuilt
+    finally:
+        for path, stat in stamps.items():
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    with open(output, 'rb') as file:
+        assert file.read() == first_build
+
+    # runs as a zipapp and imports from the archive alone, outside of the source tree
+    assert subprocess.run([sys.executable, output], cwd=out_dir).returncode == 0
+    imported = subprocess.run([sys.executable, '-c', 'import mockeries.sub_mod.dummy as d; print(d.dummy_func())'],
+                              cwd=out_dir, env={**os.environ, 'PYTHONPATH': output}, capture_output=True, text=True)
+    assert imported.stdout.strip() == '1.0', imported.stderr
+
+    # an entry inside a package runs as its module, its relative imports resolve from the archive
+    package_output = os.path.join(out_dir, 'mummy.pyz')
+    bundle('mockeries/sub_mod/mummy.py', package_output)
+    ran = subprocess.run([sys.executable, package_output], cwd=out_dir, capture_output=True, text=True)
+    assert ran.returncode == 0, ran.stderr
@@ -1,4 +1,8 @@
-from dep_crawl import extract_imports, get_src_file, get_src_files
+import os
+import tempfile
+
+from dep_crawl import (Import, IncrementalCrawl, ParseCache, build_dependency_graph, extract_imports, get_src_file,
+                       get_src_files, import_model, parse_imports, select_affected_tests)
 
 file_path = 'mockeries/mock_ref.py'
 imports = extract_imports(file_path)
@@ -6,3 +10,127 @@ src_files = [get_src_file(imp) for imp in imports]
 for src_file in src_files:
     imports = extract_imports(src_file)
 src_files = get_src_files(file_path)
+
+# ------- static resolution, nothing gets imported
+static_src_files = get_src_files(file_path, static=True)
+assert sorted(static_src_files) == sorted(src_files)
+assert sorted(get_src_files('mockeries/sub_mod/mummy.py', static=True)) == ['mockeries/sub_mod/dummy.py',
+                                                                           'mockeries/sub_mod/yummy.py']
+too_deep = Import('from ' + '.' * 64 + ' import x', 'x', None, 64)
+assert get_src_file(too_deep, file_path, static=True) is None
+# mockeries is the top-level package, a relative import cannot climb out of it into the repository
+mummy = 'mockeries/sub_mod/mummy.py'
+assert get_src_file(Import('from .. import mock_module', 'mock_module', None, 2), mummy, static=True) == \
+    os.path.abspath('mockeries/mock_module.py')
+assert get_src_file(Import('from ... import dep_crawl', 'dep_crawl', None, 3), mummy, static=True) is None
+
+# ------- dependency graph
+graph = build_dependency_graph(file_path, static=True)
+assert sorted(graph.closure(file_path)) == sorted(map(os.path.abspath, src_files))
+assert graph.importers('mockeries/sub_mod/yummy.py') == [os.path.abspath('mockeries/sub_mod/dummy.py')]
+assert graph.shortest_chain(file_path, 'mockeries/sub_mod/yummy.py')[1:] == [
+    os.path.abspath('mockeries/sub_mod/dummy.py'), os.path.abspath('mockeries/sub_mod/yummy.py')]
+assert graph.cycles() == []
+assert graph.topological_order()[-1] == os.path.abspath(file_path)
+
+# ------- persistent parse cache
+with tempfile.TemporaryDirectory() as cache_dir:
+    cache_file = os.path.join(cache_dir, 'cache.json')
+    cold_cache = ParseCache(cache_file)
+    assert sorted(get_src_files(file_path, static=True, cache=cold_cache)) == sorted(src_files)
+    assert cold_cache.stats() == {'hits': 0, 'misses': 4}
+    warm_cache = ParseCache(cache_file)
+    assert sorted(get_src_files(file_path, static=True, cache=warm_cache)) == sorted(src_files)
+    assert warm_cache.stats() == {'hits': 4, 'misses': 0}
+    # exec mode resolves by running the imported modules, only their imports are reused
+    exec_cache = ParseCache(cache_file)
+    assert sorted(get_src_files(file_path, cache=exec_cache)) == sorted(get_src_files(file_path))
+    assert exec_cache.stats() == {'hits': 4, 'misses': 0}
+    assert len({context for entry in exec_cache.entries.values() for context in entry['targets']}) == 1
+
+# ------- process pool crawl matches the serial crawl
+assert get_src_files(file_path, static=True, workers=2) == static_src_files
+
+# ------- lexing scanners find the same imports as the ast
+tricky_src = """
+'''import not_a_module'''
+import a, b.c as d; from . import e
+try: from f import (g,  # comment
+                    h as i)
+except ImportError: pass
+def j():
+    text = "import k"
+    from ..l import m
+class N:
+    import o
+"""
+assert parse_imports(tricky_src, scanner='fast') == parse_imports(tricky_src)
+assert [imp.stmt for imp in parse_imports(tricky_src, scanner='toplevel')] == ['import a', 'import b.c',
+                                                                              'from . import e', 'from f import g',
+                                                                              'from f import h']
+assert parse_imports(tricky_src, scanner='header') == parse_imports(tricky_src, scanner='toplevel')
+block_srcs = ['x = 1; import os', 'print("hi"); from x import y', 'if a and \\\n        b: import c',
+              'try: import ujson as json\nexcept ImportError: import json', 'if True: import a; import b',
+              'with x: import a', 'try:\n    import ujson as json\nexcept ImportError:\n    import json\n']
+for block_src in block_srcs:
+    for scanner in 'fast', 'toplevel', 'header':
+        assert parse_imports(block_src, scanner=scanner) == parse_imports(block_src), (scanner, block_src)
+nested_src = 'if x:\n    def f():\n        import a\n    import b\ndef g():\n    import c\nimport d\n'
+assert [imp.stmt for imp in parse_imports(nested_src, scanner='toplevel')] == ['import b', 'import d']
+assert [imp.stmt for imp in parse_imports(nested_src, scanner='header')] == ['import b']
+assert get_src_files(file_path, static=True, scanner='fast') == static_src_files
+
+# ------- incremental crawl
+with tempfile.TemporaryDirectory() as tree:
+    def write(name, src):
+        path = os.path.join(tree, name)
+        with open(path, 'w') as file:
+            file.write(src)
+        os.utime(path, ns=(os.stat(path).st_mtime_ns + 10 ** 9,) * 2)
+        os.utime(tree, ns=(os.stat(tree).st_mtime_ns + 10 ** 9,) * 2)
+        return path
+
+    entry = write('main.py', 'from . import a\n')
+    write('a.py', 'from . import b\n')
+    write('b.py', 'x = 1\n')
+    crawl = IncrementalCrawl(entry, tree, static=True)
+    assert crawl.files() == get_src_files(entry, tree, static=True)
+    write('a.py', 'from . import c\n')
+    write('c.py', 'from . import b\n')
+    delta = crawl.poll()
+    assert delta.added == [os.path.join(tree, 'c.py')] and delta.removed == []
+    os.remove(os.path.join(tree, 'c.py'))
+    delta = crawl.poll()
+    assert delta.removed == [os.path.join(tree, 'b.py'), os.path.join(tree, 'c.py')]
+    assert crawl.files() == get_src_files(entry, tree, static=True)
+    # an untracked file is listed once, it enters the crawl when a tracked file starts importing it
+    write('unused.py', 'x = 1\n')
+    assert not crawl.poll()
+    write('notes.txt', '')
+    assert not crawl.poll()
+    write('a.py', 'from . import unused\n')
+    delta = crawl.poll()
+    assert delta.added == [os.path.join(tree, 'unused.py')] and delta.reparsed == [os.path.join(tree, 'a.py')]
+    # a file saved mid-edit does not parse, it is retried until it does
+    write('a.py', 'x = (\n')
+    for _ in range(2):
+        try:
+            crawl.poll()
+        except SyntaxError:
+            pass
+        else:
+            raise AssertionError('a.py does not parse')
+    write('a.py', 'from . import b\n')
+    delta = crawl.poll()
+    assert delta.added == [os.path.join(tree, 'b.py')] and delta.removed == [os.path.join(tree, 'unused.py')]
+
+# ------- affected tests from the reverse import graph
+fake_tests = ['mockeries/mock_ref.py', 'mockeries/sub_mod/mummy.py', 'mockeries/mock_module.py']
+assert select_affected_tests(['mockeries/sub_mod/yummy.py'], fake_tests) == fake_tests[:2]
+assert select_affected_tests(['mockeries/mock_module.py'], fake_tests) == [fake_tests[0], fake_tests[2]]
+assert select_affected_tests(['README.md'], fake_tests) == []
+
+# Import is a plain record, the pydantic model is an opt-in adapter
+imp = parse_imports('from .sub_mod import dummy', 'mockeries/mummy.py')[0]
+assert imp == Import('from .sub_mod import dummy', 'dummy', 'sub_mod', 1) and hash(imp)
+assert import_model()(**imp._asdict()).to_import() == imp
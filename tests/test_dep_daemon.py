@@ -0,0 +1,66 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from dep_crawl import get_src_files
+from dep_daemon import DepClient, DepServer, query
+
+logging.getLogger('dep_daemon').setLevel(logging.CRITICAL)  # the mid-edit save below fails every poll
+file_path = 'mockeries/mock_ref.py'
+with tempfile.TemporaryDirectory() as tmp_dir:
+    socket_path = os.path.join(tmp_dir, 'dep.sock')
+    server = DepServer(socket_path, interval=0.05)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        assert query('ping', socket_path) == 'pong'
+        closure = query('closure', socket_path, file=file_path)
+        assert closure == [os.path.abspath(path) for path in get_src_files(file_path, static=True)]
+
+        with DepClient(socket_path) as client:
+            yummy = 'mockeries/sub_mod/yummy.py'
+            assert client.query('importers', file=file_path, target=yummy) == [os.path.abspath('mockeries/sub_mod/dummy.py')]
+            assert client.query('rdeps', file=file_path, target=yummy) == [os.path.abspath(path) for path in
+                                                                           ('mockeries/sub_mod/dummy.py', file_path)]
+            assert client.query('rdeps', file=file_path, target='mockeries/mummy.py') == []
+            assert client.query('cycles', file=file_path) == []
+            assert client.query('chain', file=file_path, src=file_path, dst=yummy) == [
+                os.path.abspath(path) for path in (file_path, 'mockeries/sub_mod/dummy.py', yummy)]
+            try:
+                client.query('nope', file=file_path)
+                assert False
+            except RuntimeError as error:
+                assert 'unknown op' in str(error)
+
+        # the resident graph follows edits on disk without a restart
+        project = os.path.join(tmp_dir, 'project')
+        os.makedirs(project)
+        main, util = os.path.join(project, 'main.py'), os.path.join(project, 'util.py')
+        with open(main, 'w') as file:
+            file.write('x = 1\n')
+        assert query('closure', socket_path, file=main, bound_path=project) == []
+        with open(util, 'w') as file:
+            file.write('y = 2\n')
+        with open(main, 'w') as file:
+            file.write('from . import util\n')
+        deadline = time.monotonic() + 5
+        while query('closure', socket_path, file=main, bound_path=project) != [util]:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        # a file saved mid-edit does not stop the watcher, the fixed file is picked up
+        with open(main, 'w') as file:
+            file.write('x = (\n')
+        time.sleep(0.2)
+        assert server.store.watcher.is_alive()
+        with open(main, 'w') as file:
+            file.write('x = 1\n')
+        deadline = time.monotonic() + 5
+        while query('closure', socket_path, file=main, bound_path=project) != []:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        assert {crawl['file']: crawl['files'] for crawl in query('stats', socket_path)['crawls']}[main] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert not os.path.exists(socket_path)
@@ -0,0 +1,47 @@
+import ast
+
+from hot_inline import HotInliner, hot_inline, inline_blockers, inline_call, report
+from mockeries import hot_loop
+
+inliner = HotInliner(hot_loop.workload, 'mockeries', repeat=1)
+hot = {func.name: func for func in inliner.profile()}
+assert hot['scale'].calls == 20000 and hot['scale'].size == 2 and not hot['scale'].blockers
+assert hot['clamp'].blockers == ['returns before its last statement']
+assert list(hot)[0] == 'scale'  # most calls per statement
+
+variants = hot_inline(hot_loop.workload, 'mockeries', repeat=1)
+assert [(variant.callee.name, variant.caller) for variant in variants] == [('scale', 'total')]
+variant = variants[0]
+assert variant.problem is None and variant.before_s and variant.after_s
+assert 'scale(' not in variant.source and '_scale_ret = _scale_scaled + 1' in variant.source
+# the live function is restored after timing
+assert hot_loop.total.__code__.co_firstlineno == 12 and 'scale' in hot_loop.total.__code__.co_names
+print(report(variants))
+
+# ------- the callee's body only moves before its statement when nothing evaluated earlier can tell
+reads_first = ast.parse('def f(xs):\n    return xs[0] + g(xs)\n').body[0]
+g_def = ast.parse('def g(xs):\n    xs[0] = 5\n    return 0\n').body[0]
+try:
+    inline_call(reads_first, g_def, reads_first.body[0].value.right)
+except LookupError as error:
+    assert str(error) == 'a Subscript before it in the statement would be evaluated after it'
+else:
+    raise AssertionError('xs[0] would have been read after g ran')
+names_first = ast.parse('def f(xs, n):\n    return n + g(xs)\n').body[0]
+inline_call(names_first, g_def, names_first.body[0].value.right)
+assert ast.unparse(names_first.body[-1]) == 'return n + _g_ret'
+
+# the body reads its globals in the caller's scope, where a local of the same name would shadow them
+shadows_k = ast.parse('def f(x):\n    K = 3\n    return mul(x) + K\n').body[0]
+mul_def = ast.parse('def mul(v):\n    return v * K\n').body[0]
+try:
+    inline_call(shadows_k, mul_def, shadows_k.body[1].value.left)
+except LookupError as error:
+    assert str(error) == "K would read the caller's local instead of the global"
+else:
+    raise AssertionError('mul would have read the local K')
+
+# a mutable default is shared between calls, an inlined copy would be fresh on every one
+assert inline_blockers(ast.parse('def g(x, acc=[]):\n    return acc\n').body[0]) == [
+    'default that is not an immutable literal']
+assert inline_blockers(ast.parse('def g(x, low=-1, shape=(2, 3), name=None):\n    return x\n').body[0]) == []
@@ -0,0 +1,26 @@
+from import_profile import parse_importtime, profile_imports
+
+file_path = 'mockeries/mock_ref.py'
+profile = profile_imports(file_path, memory=True)
+print(profile.report())
+
+assert profile.chain('mockeries.sub_mod.yummy') == [file_path, 'mockeries.sub_mod.dummy', 'mockeries.sub_mod.yummy']
+assert {cost.module for cost in profile.entry_edges()} >= {'mockeries.mock_module', 'mockeries.sub_mod.dummy'}
+edge_costs = profile.edge_costs()
+assert len(edge_costs) == len(list(profile.graph.edges()))
+assert all(cost > 0 for cost in edge_costs.values())
+assert 'os' in profile.preloaded  # loaded at interpreter startup, the entry's `import os` is free
+
+# ------- a package module runs in its package, its relative imports resolve
+package_profile = profile_imports('mockeries/sub_mod/mummy.py')
+assert package_profile.chain('mockeries.sub_mod.yummy') == ['mockeries/sub_mod/mummy.py', 'mockeries.sub_mod.dummy',
+                                                            'mockeries.sub_mod.yummy']
+assert all(package_profile.edge_costs().values())
+
+# ------- post-order importtime output, children are listed before their parent
+stderr = '''import time: self [us] | cumulative | imported package
+import time:        10 |         10 |     c
+import time:        20 |         30 |   b
+import time:         5 |         35 | a
+import time:         7 |          7 | d'''
+assert parse_importtime(stderr) == [('c', 10, 10, 'b'), ('b', 20, 30, 'a'), ('a', 5, 35, None), ('d', 7, 7, None)]
@@ -3,7 +3,8 @@ import inspect
 
 from icecream import Source, ic
 
-from ast_inline import VariableCollector, extract_import, inline_src
+from ast_inline import (MaterializePolicy, VariableCollector, build_name_index, call_node_cache, clear_ast_caches,
+                        extract_import, get_source_ast, inline_src, parse_obj_to_ast_node, source_ast_cache)
 from mockeries.mock_module import A, B, C, add_func
 
 # ------- test function
@@ -51,5 +52,61 @@ inline_src(b())
 print(ast.dump(func_ast, indent=4))
 print(ast.unparse(func_ast))
 
+
+# ------ test names resolved from the caller's locals, locals shadow globals
+def inline_from_function():
+    some_list = [1]
+    local_args = (some_list, 3)
+    return inline_src(add_func(*local_args), debug=True)
+
+
+argument_map, func_ast, new_func_ast = inline_from_function()
+assert ast.unparse(argument_map['x']) == 'some_list' and ast.unparse(argument_map['y']) == '3'
+shared = object()
+assert build_name_index({'first': shared, 'second': shared}, {'other': shared}) == {id(shared): 'first'}
+assert ast.unparse(parse_obj_to_ast_node(None, {'unset': None})) == 'None'
+
 # todo:
 #  1. add import statements by checking unbound names
+
+# ------ test parsed source / call node caches
+clear_ast_caches()
+for _ in range(3):
+    inline_src(add_func(1, 1))
+assert (source_ast_cache.misses, source_ast_cache.hits) == (1, 2)
+assert (call_node_cache.misses, call_node_cache.hits) == (1, 2)
+src, first = get_source_ast(add_func)
+first.body[0].name = 'changed'  # callers get their own copy
+assert get_source_ast(add_func)[1].body[0].name == 'add_func'
+
+# ------ test size aware materialization of argument values
+policy = MaterializePolicy(max_items=5, preview_items=2, max_str_len=8)
+assert ast.unparse(parse_obj_to_ast_node([1, (2,), {3: [4]}], name_index={}, policy=policy)) == '[1, (2,), {3: [4]}]'
+assert ast.unparse(parse_obj_to_ast_node(list(range(10)), name_index={}, policy=policy)) == '[0, 1, ...]'
+assert ast.unparse(parse_obj_to_ast_node(dict.fromkeys('abcdef'), name_index={}, policy=policy)) == \
+       "{'a': None, 'b': None, ...: ...}"
+assert ast.unparse(parse_obj_to_ast_node('long string', name_index={}, policy=policy)) == 'str(..., len=11)'
+assert ast.unparse(parse_obj_to_ast_node(object(), name_index={})) == 'object(...)'
+assert ast.unparse(parse_obj_to_ast_node(A(3), name_index={id(A): 'A'})) == 'A(...)'
+huge = [[i] * 1000 for i in range(1000)]
+huge_ast = parse_obj_to_ast_node(huge, name_index={}, policy=policy._replace(max_items=1000))
+assert sum(1 for _ in ast.walk(huge_ast)) < 3 * policy.max_nodes
+
+
+def inline_huge():
+    big_args = (list(range(10 ** 6)), 2)
+    argument_map, _, _ = inline_src(add_func(*big_args), debug=True)
+    return argument_map
+
+
+assert ast.unparse(inline_huge()['x']) == '[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, ...]'
+
+# ------ test transitive inlining: calls in the inlined block are inlined too, names stay apart
+_, _, deep_ast = inline_src(c.q(2), debug=True, depth=2)
+deep_src = ast.unparse(deep_ast.body[0].body)
+assert 'A.p(' not in deep_src and '_p_ret = _p_self.a + _p_b' in deep_src
+exec_namespace = {'c': c}
+exec(deep_src, exec_namespace)
+assert exec_namespace['q_ret'] == c.q(2)
+_, _, flat_ast = inline_src(add_func(1, 1), debug=True, depth=2, optimize=True)
+assert ast.unparse(flat_ast.body[0].body) == 'import math\nmath.log(3)\nadd_func_ret = 2'
@@ -0,0 +1,166 @@
+import timeit
+
+from inline_calls import compile_inlined, inline_calls
+from mockeries import hot_loop
+from mockeries.hot_loop import Vec, scale, square
+
+
+def offset(value):
+    return value + 1
+
+
+def energy(points):
+    acc = 0
+    for x, y in points:
+        squares = square(x) + hot_loop.square(y)
+        acc += squares + Vec.dot(x, y, 1, 1)
+        acc += offset(scale(x, factor=3))
+        print_count = len(points)
+    return acc + print_count
+
+
+fast_energy = inline_calls(energy)
+points = [(x, x % 7) for x in range(2000)]
+assert fast_energy(points) == energy(points)
+
+inlined = compile_inlined(energy)
+assert inlined.inlined == ['square', 'hot_loop.square', 'Vec.dot', 'offset', 'scale']
+assert inlined.skipped == [('len', 'len is not a module global')]
+assert 'square(' not in inlined.source and '_scale_ret' in inlined.source
+assert compile_inlined(energy) is inlined  # cached per code object
+print(inlined.source)
+print('plain', timeit.timeit(lambda: energy(points), number=20))
+print('inlined', timeit.timeit(lambda: fast_energy(points), number=20))
+
+# rebinding a callee falls back to the original function
+original_square = square
+square = lambda value: -value * value  # noqa: E731
+assert fast_energy(points) == energy(points)
+square = original_square
+original_dot = Vec.__dict__['dot']
+hot_loop.Vec.dot = staticmethod(lambda *args: 0)
+assert fast_energy(points) == energy(points)
+hot_loop.Vec.dot = original_dot
+
+
+@inline_calls(max_size=1)
+def only_tiny(x):
+    return scale(x) + square(x)
+
+
+assert only_tiny(3) == scale(3) + square(3)
+assert compile_inlined(only_tiny.__wrapped__, 1).skipped == [
+    ('scale', '2 statements'), ('square', 'a Call before it in the statement would be evaluated after it')]
+
+
+# ------- depth: calls in inlined bodies are inlined in turn, recursion stays a call
+def half(value):
+    return value / 2
+
+
+def quarter(value):
+    return half(half(value))
+
+
+def ping(n):
+    return pong(n)
+
+
+def pong(n):
+    return ping(n)
+
+
+def chain(value):
+    return quarter(value) + 1
+
+
+def bounce(n):
+    return ping(n)
+
+
+assert compile_inlined(chain).inlined == ['quarter']
+deep = compile_inlined(chain, depth=2)
+assert deep.inlined == ['quarter', 'half', 'half'] and 'half(' not in deep.source
+assert inline_calls(depth=2)(chain)(12) == chain(12) == 4
+assert compile_inlined(bounce, depth=5).inlined == ['ping', 'pong']
+assert compile_inlined(bounce, depth=5).skipped == [('ping', 'recursive')]
+
+# ------- arguments are evaluated in call order, callees may mutate what they are given but not store into it
+log = []
+
+
+def note(label):
+    log.append(label)
+    return label
+
+
+def pair(first, second):
+    return first + second
+
+
+def tag(items, label):
+    items[0] = label
+
+
+def label_first(items):
+    tag(items, 'first')
+    return note(items)
+
+
+def use():
+    return pair(note('first'), note('second')) + pair(second=note('fourth'), first=note('third'))
+
+
+assert inline_calls(use)() == 'firstsecondthirdfourth' and log == ['first', 'second', 'fourth', 'third']
+assert compile_inlined(use).inlined == ['pair', 'note', 'note', 'pair', 'note', 'note']
+assert compile_inlined(label_first).skipped == [('tag', 'stores to an attribute or item')]
+assert compile_inlined(label_first).inlined == ['note']
+
+
+# ------- a method reached through its class is called unbound, a rebound class dict entry falls back
+class Counter:
+    def bump(self, n):
+        return n + 1
+
+
+def bump_dot(counter):
+    dot = Vec.dot(1, 2, 3, 4)
+    return Counter.bump(counter, dot)
+
+
+assert compile_inlined(bump_dot).skipped == [('Counter.bump', 'Counter.bump is called unbound')]
+fast_bump = inline_calls(bump_dot)
+assert fast_bump(Counter()) == 12
+hot_loop.Vec.dot = classmethod(lambda cls, *args: 0)
+assert fast_bump(Counter()) == 1
+hot_loop.Vec.dot = original_dot
+
+
+# ------- a callee's global stays a call when the caller has a local of that name, at any depth
+K = 10
+
+
+def mul(v):
+    return v * K
+
+
+def mul_twice(v):
+    return mul(v) * 2
+
+
+def shadow(x):
+    K = 3
+    return mul(x) + K
+
+
+def shadow_deep(x):
+    K = 3
+    return mul_twice(x) + K
+
+
+shadowed_k = "K would read the caller's local instead of the global"
+assert inline_calls(shadow)(2) == shadow(2) == 23
+assert compile_inlined(shadow).skipped == [('mul', shadowed_k)]
+assert inline_calls(depth=2)(shadow_deep)(2) == shadow_deep(2) == 43
+assert compile_inlined(shadow_deep, depth=2).inlined == ['mul_twice']
+assert compile_inlined(shadow_deep, depth=2).skipped == [('mul', shadowed_k)]
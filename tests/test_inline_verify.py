@@ -0,0 +1,29 @@
+from inline_verify import fixture_cases, report, run_cases, stress_cases, verify
+from mockeries.mock_module import A, C, abc, add_func
+
+results = run_cases(fixture_cases() + stress_cases(4))
+print(report(results))
+assert all(result.ok for result in results.values()), [name for name, result in results.items() if not result.ok]
+assert results['super call depth 2'].ret_var == 'q_ret' and 'A.p(' not in results['super call depth 2'].block
+
+timed = verify('add_func(1, 1)', {'add_func': add_func, 'abc': abc}, optimize=True, number=200, repeat=2)
+assert timed.ok and timed.original_s > 0 and timed.inlined_s > 0 and timed.speedup
+
+# the block reads the callee's globals from the call site
+missing = verify('add_func(1, 1)', {'add_func': add_func})
+assert not missing.equal and missing.error == "call: returned 2, block: NameError: name 'abc' is not defined"
+
+# the block runs in the call site's scope: a local of the callee is renamed apart from the caller's variables
+clobbered = verify('c.q(2)', {'A': A, 'c': C(), 'out': 'caller value', 'b': 'caller value'})
+assert clobbered.ok and 'out_ = ' in clobbered.block and 'b_ = 2' in clobbered.block
+
+
+# a nested function's parameter is renamed along with the names it shadows
+def twice_plus(x):
+    def twice(x):
+        return x * 2
+    return twice(5) + x
+
+
+shadowed = verify('twice_plus(3)', {'twice_plus': twice_plus, 'x': 7})
+assert shadowed.ok and 'def twice(x_):' in shadowed.block, shadowed
@@ -0,0 +1,78 @@
+from lazy_imports import check_rewrite, rewrite_closure, rewrite_source
+
+src = '''import json
+import os
+import re
+from collections import OrderedDict as OD, defaultdict
+
+PATTERN = re.compile('a')
+
+
+def load(path, default=defaultdict):
+    """Load json."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def listing(root):
+    while True:
+        return [os.path.join(root, name) for name in os.listdir(root)] + list(OD())
+
+
+class Store:
+    def save(self, data):
+        json = None
+        return json
+
+    def sep(self): return os.sep
+'''
+rewrite = rewrite_source(src)
+print(rewrite.diff())
+assert rewrite.ok
+assert rewrite.deferred == {'import json': ['load'], 'from collections import OrderedDict as OD': ['listing']}
+namespace = {}
+exec(rewrite.new_source, namespace)
+assert 'json' not in namespace and 'OD' not in namespace and 'defaultdict' in namespace
+assert namespace['listing']('mockeries') == [f'mockeries/{name}' for name in __import__('os').listdir('mockeries')]
+
+# ------- a nested scope's own binding does not hide the outer function's read of the global
+nested_src = """import json
+
+
+def f():
+    def g():
+        json = 1
+        return json
+    return json.dumps(g())
+
+
+def h():
+    return json.dumps(2)
+"""
+rewrite = rewrite_source(nested_src)
+assert rewrite.ok and rewrite.deferred == {'import json': ['f', 'h']}
+namespace = {}
+exec(rewrite.new_source, namespace)
+assert namespace['f']() == '1'
+broken = nested_src.replace('import json\n', '').replace('    return json.dumps(2)', '    import json\n    return 2')
+assert check_rewrite(nested_src, broken, {'json'}) == ["f reads ['json'] without importing it"]
+
+# ------- the import goes above the decorators of a function's first statement
+decorated_src = """import os
+
+
+def f():
+    @staticmethod
+    def g(): return os.sep
+    return g
+"""
+rewrite = rewrite_source(decorated_src)
+assert rewrite.ok and rewrite.deferred == {'import os': ['f']}
+assert '    import os\n    @staticmethod\n' in rewrite.new_source
+
+# ------- the whole closure of an entry file, with the startup saving estimated from an import profile
+rewrites = rewrite_closure('mockeries/mock_ref.py')
+for rewrite in rewrites:
+    print(rewrite.diff(), rewrite.saving_us)
+assert [rewrite.file.rsplit('/', 1)[-1] for rewrite in rewrites] == ['dummy.py']
+assert all(rewrite.ok and rewrite.saving_us is not None for rewrite in rewrites)
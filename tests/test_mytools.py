@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+from import_profile import parse_importtime
+
+IMPORT_BUDGET_US = 20_000  # ~3 ms measured for `import mytools`, it was ~700 ms when it loaded both tools eagerly
+
+check = 'import sys, mytools; assert not {"ast_inline", "dep_crawl", "icecream", "ipdb", "pydantic"} & set(sys.modules)'
+result = subprocess.run([sys.executable, '-X', 'importtime', '-c', check], capture_output=True, text=True)
+assert result.returncode == 0, result.stderr
+costs = {module: cumulative_us for module, _, cumulative_us, _ in parse_importtime(result.stderr)}
+assert costs['mytools'] < IMPORT_BUDGET_US, f'import mytools took {costs["mytools"]} us'
+
+# tools load on first use and stay bound
+import mytools
+
+assert 'inline_src' in dir(mytools)
+assert mytools.get_src_files('mockeries/mock_ref.py') == ['mockeries/mock_module.py', 'mockeries/sub_mod/dummy.py',
+                                                        'mockeries/sub_mod/yummy.py']
+assert 'get_src_files' in vars(mytools) and 'inline_src' not in vars(mytools)
+from mytools import inline_src
+from ast_inline import inline_src as ast_inline_src
+
+assert inline_src is ast_inline_src
+try:
+    mytools.nope
+    assert False
+except AttributeError:
+    pass